@@ -0,0 +1,28 @@
+import datasets
+import pytest
+
+
+def pytest_configure(config):
+    # Every round must recompute the maps and filters instead of reading them
+    # back from the cache of the previous round.
+    datasets.disable_caching()
+    datasets.disable_progress_bars()
+
+
+@pytest.fixture
+def rows_per_second(benchmark):
+    """Run `function` under the benchmark and record the throughput over `n_rows`."""
+
+    def run(function, n_rows, rounds=None):
+        if rounds is None:
+            result = benchmark(function)
+        else:
+            result = benchmark.pedantic(function, rounds=rounds, warmup_rounds=1)
+        benchmark.extra_info["n_rows"] = n_rows
+        # There are no stats with --benchmark-disable.
+        if benchmark.stats:
+            rows_per_second = n_rows / benchmark.stats.stats.mean
+            benchmark.extra_info["rows_per_second"] = rows_per_second
+        return result
+
+    return run
@@ -0,0 +1,91 @@
+"""Synthetic parallel corpora for the benchmarks.
+
+The words are drawn from the Portuguese and English texts of `tests/`, and a
+fraction of the rows gets the kind of noise the cleaning pipeline targets:
+social media markup, URLs, HTML, literature codes, bullets, boilerplate
+patterns, invalid characters and (near-)duplicates.
+"""
+
+import functools
+import random
+from pathlib import Path
+
+import datasets
+
+TESTS_PATH = Path(__file__).parent.parent / "tests"
+
+LENGTHS = {
+    "short": (5, 20),
+    "long": (100, 400),
+}
+
+NOISE = [
+    lambda text: f"RT @user: {text}",
+    lambda text: f"{text} @mention #hashtag",
+    lambda text: f"{text} https://www.example.pt/noticias?id=42",
+    lambda text: f"<p>{text}</p> <a href='#'>ligação</a> &amp; mais",
+    lambda text: f"COD _ abc {text}",
+    lambda text: f"1. {text}",
+    lambda text: f"--- nota --- {text}",
+    lambda text: f'" {text} "',
+    lambda text: f"Sort by {text}",
+    lambda text: f"{text} ©",
+    lambda text: f"{text}.....",
+]
+
+
+@functools.cache
+def _vocabulary(filename):
+    return (TESTS_PATH / filename).read_text().split()
+
+
+def _n_words(rng, lengths):
+    if lengths == "mixed":
+        return min(1_000, max(1, int(rng.lognormvariate(3.5, 1.0))))
+    return rng.randint(*LENGTHS[lengths])
+
+
+@functools.cache
+def make_corpus(n_rows, lengths="mixed", noise_rate=0.1, duplicate_rate=0.1, seed=0):
+    """Rows with `pt`, `en` and `domain` columns.
+
+    lengths: "short", "long" or "mixed" (log-normal number of words).
+    noise_rate: fraction of the rows with noise.
+    duplicate_rate: fraction of the rows that copy an earlier row, either fully
+        or only its start and end.
+    """
+    rng = random.Random(seed)
+    pt_words = _vocabulary("long_text.txt")
+    en_words = _vocabulary("long_text_en.txt")
+
+    rows = []
+    for _ in range(n_rows):
+        if rows and rng.random() < duplicate_rate:
+            row = dict(rng.choice(rows))
+            if rng.random() < 0.5:
+                middle = " ".join(rng.choices(pt_words, k=5))
+                row["pt"] = f"{row['pt'][:80]} {middle} {row['pt'][-80:]}"
+            rows.append(row)
+            continue
+
+        n_words = _n_words(rng, lengths)
+        pt = " ".join(rng.choices(pt_words, k=n_words))
+        en = " ".join(rng.choices(en_words, k=n_words))
+        if rng.random() < noise_rate:
+            noise = rng.choice(NOISE)
+            pt, en = noise(pt), noise(en)
+        rows.append({"pt": pt, "en": en, "domain": rng.choice(["web", "journalistic"])})
+    return rows
+
+
+@functools.cache
+def make_dataset(n_rows, lengths="mixed"):
+    """Corpus as a `datasets.Dataset`, with whitespace token counts so that the
+    filters don't need the tokenizer."""
+    dataset = datasets.Dataset.from_list(make_corpus(n_rows, lengths))
+    return dataset.map(
+        lambda x: {
+            "n_tokens_pt": len(x["pt"].split()),
+            "n_tokens_en": len(x["en"].split()),
+        }
+    )
@@ -0,0 +1,135 @@
+import pytest
+
+from corpus import make_corpus, make_dataset
+from src.process import (
+    bad_translation,
+    drop_duplicates,
+    drop_duplicates_start_ends,
+    has_hashtag,
+    has_html_tags,
+    has_invalid_character,
+    has_invalid_end,
+    has_invalid_middle,
+    has_invalid_start,
+    has_mention,
+    has_more_than_three_points,
+    has_too_long_word,
+    has_url,
+    has_valid_brackets,
+    has_valid_quotes,
+    huggingface_dataset_filter,
+    huggingface_dataset_transform,
+    is_empty,
+    match_invalid_pattern,
+    remove_bullets,
+    remove_cod_literature,
+    remove_hashtags,
+    remove_html_tags,
+    remove_mentions,
+    remove_quote_space_end,
+    remove_quote_space_start,
+    remove_retweets,
+    remove_three_dashes,
+    remove_urls,
+    starts_with_month,
+    transform_text,
+)
+
+N_ROWS = 10_000
+DATASET_N_ROWS = [10_000, 100_000]
+LENGTHS = ["short", "mixed", "long"]
+
+PREDICATES = [
+    has_hashtag,
+    has_mention,
+    has_url,
+    starts_with_month,
+    has_too_long_word,
+    has_invalid_start,
+    has_invalid_middle,
+    has_invalid_end,
+    match_invalid_pattern,
+    has_html_tags,
+    has_more_than_three_points,
+    has_valid_brackets,
+    has_valid_quotes,
+    is_empty,
+    has_invalid_character,
+]
+
+TRANSFORMS = [
+    remove_retweets,
+    remove_mentions,
+    remove_hashtags,
+    remove_urls,
+    remove_html_tags,
+    remove_cod_literature,
+    remove_bullets,
+    remove_three_dashes,
+    remove_quote_space_start,
+    remove_quote_space_end,
+    transform_text,
+]
+
+
+@pytest.mark.benchmark(group="predicates")
+@pytest.mark.parametrize("lengths", LENGTHS)
+@pytest.mark.parametrize("predicate", PREDICATES, ids=lambda f: f.__name__)
+def test_predicate(rows_per_second, predicate, lengths):
+    texts = [row["pt"] for row in make_corpus(N_ROWS, lengths)]
+    rows_per_second(lambda: [predicate(text) for text in texts], N_ROWS)
+
+
+@pytest.mark.benchmark(group="predicates")
+@pytest.mark.parametrize("lengths", LENGTHS)
+def test_bad_translation(rows_per_second, lengths):
+    rows = make_corpus(N_ROWS, lengths)
+    rows_per_second(
+        lambda: [bad_translation(row["pt"], row["en"]) for row in rows], N_ROWS
+    )
+
+
+@pytest.mark.benchmark(group="transforms")
+@pytest.mark.parametrize("lengths", LENGTHS)
+@pytest.mark.parametrize("transform", TRANSFORMS, ids=lambda f: f.__name__)
+def test_transform(rows_per_second, transform, lengths):
+    texts = [row["pt"] for row in make_corpus(N_ROWS, lengths)]
+    rows_per_second(lambda: [transform(text) for text in texts], N_ROWS)
+
+
+def bs4_remove_html_tags(text):
+    """The BeautifulSoup stripper that `remove_html_tags` replaced."""
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(text, "html.parser").get_text()
+
+
+@pytest.mark.benchmark(group="html")
+@pytest.mark.parametrize("lengths", LENGTHS)
+@pytest.mark.parametrize(
+    "stripper", [remove_html_tags, bs4_remove_html_tags], ids=lambda f: f.__name__
+)
+def test_html_stripper(rows_per_second, stripper, lengths):
+    if stripper is bs4_remove_html_tags:
+        pytest.importorskip("bs4")
+    # Only the texts with markup, which skip the fast path of remove_html_tags.
+    texts = [row["pt"] for row in make_corpus(N_ROWS, lengths)]
+    texts = [text for text in texts if "<" in text or "&" in text]
+    rows_per_second(lambda: [stripper(text) for text in texts], len(texts))
+
+
+@pytest.mark.benchmark(group="datasets")
+@pytest.mark.parametrize("n_rows", DATASET_N_ROWS)
+@pytest.mark.parametrize(
+    "stage",
+    [
+        huggingface_dataset_filter,
+        huggingface_dataset_transform,
+        drop_duplicates,
+        drop_duplicates_start_ends,
+    ],
+    ids=lambda f: f.__name__,
+)
+def test_dataset_stage(rows_per_second, stage, n_rows):
+    dataset = make_dataset(n_rows)
+    rows_per_second(lambda: stage(dataset), n_rows, rounds=3)
@@ -0,0 +1,45 @@
+import logging
+
+from fire import Fire
+
+from src.data import load_dataset, merge_shards, merge_workers
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main(
+    lang="en",
+    name="pt_vid",
+    domain="journalistic",
+    split="train",
+    parts=1,
+    queue=False,
+    allow_gaps=False,
+    checkpoint=None,
+):
+    """Merge the outputs of `scripts/translate_mp.py --part i/<parts>` into
+    `data/<lang>_<name>_<domain>_<split>`, or with `queue` the outputs of
+    the workers of `scripts/translate_mp.py --queue`.
+
+    Fails if a shard is missing, if a shard holds ids of another part, or if some
+    ids of the split are not translated. With `allow_gaps` the missing ids are
+    only reported (e.g. texts whose translation failed).
+
+    checkpoint = ["journal", "json", "arrow"], the storage of the merged dataset.
+    By default "arrow" if the dataset or one of the inputs is an Arrow file.
+
+    python scripts/merge_shards.py -l "en" -n "pt_vid" -d "web" -s "train" --parts 4
+    python scripts/merge_shards.py -l "en" -n "pt_vid" -d "web" -s "train" --queue
+    """
+    dataset = load_dataset(name)
+    ds_name = f"{lang}_{name}_{domain}_{split}"
+    expected_ids = range(len(dataset[domain][split]))
+    if queue:
+        merged = merge_workers(ds_name, expected_ids, allow_gaps, checkpoint)
+    else:
+        merged = merge_shards(ds_name, parts, expected_ids, allow_gaps, checkpoint)
+    logging.info(f"Merged into {ds_name}: {len(merged)} texts.")
+
+
+if __name__ == "__main__":
+    Fire(main)
@@ -1,59 +1,113 @@
-import json
 import logging
 
 import datasets
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from datasets.table import concat_tables
 from fire import Fire
-from tqdm import tqdm
 
 from src.constants import DATA_PATH
+from src.data import translation_table
+from src.pipeline import Pipeline, Stage, from_stream
+from src.profiling import REPORTS_PATH, Profiler
 from src.process import (
+    add_n_tokens,
     drop_duplicates,
     drop_duplicates_start_ends,
     drop_justext_bad_class,
+    drop_near_duplicates,
     huggingface_dataset_filter,
     huggingface_dataset_transform,
+    stream_clean,
+    stream_drop_justext_bad_class,
 )
 
 logging.basicConfig(level=logging.INFO)
 
 
-def raw():
+def raw_dataset():
+    """The train (PT-VID) and valid (DSL-TL) splits of every translated dataset,
+    built from the Arrow tables of the datasets (see `translation_table`)."""
     train, valid = [], []
     idx = 0
-    for filepath in DATA_PATH.glob("*.json"):
-        logging.info(f"Formatting {filepath.stem}.")
-        content = json.load(filepath.open())
-        for _, info in tqdm(content.items()):
-            info.pop("split")
-            info["idx"] = idx
-            idx += 1
-            if info["source"] == "dsl_tl":
-                valid.append(info)
-            else:
-                train.append(info)
-
-    logging.debug(f"Train: {len(train)}")
-    logging.debug(f"Valid: {len(valid)}")
+    filepaths = [
+        *DATA_PATH.glob("*.json"),
+        *DATA_PATH.glob("*.jsonl"),
+        *DATA_PATH.glob("*.arrow"),
+    ]
+    for name in sorted({filepath.stem for filepath in filepaths}):
+        logging.info(f"Formatting {name}.")
+        table = translation_table(name)
+        if not len(table):
+            logging.info(f"Skipping {name}, which is empty.")
+            continue
+        table = table.drop([c for c in ["id", "split"] if c in table.column_names])
+        idxs = pa.array(np.arange(idx, idx + len(table)))
+        if "idx" in table.column_names:
+            table = table.set_column(table.column_names.index("idx"), "idx", idxs)
+        else:
+            table = table.append_column("idx", idxs)
+        idx += len(table)
 
-    logging.info("Pushing to Hugging Face Datasets.")
-    dataset = datasets.DatasetDict(
+        is_valid = pc.equal(table["source"], "dsl_tl")
+        if pc.all(is_valid).as_py():
+            valid.append(table)
+        elif not pc.any(is_valid).as_py():
+            train.append(table)
+        else:
+            valid.append(table.filter(is_valid))
+            train.append(table.filter(pc.invert(is_valid)))
+
+    logging.debug(f"Train: {sum(map(len, train))}")
+    logging.debug(f"Valid: {sum(map(len, valid))}")
+    return datasets.DatasetDict(
         {
-            "train": datasets.Dataset.from_list(train),
-            "valid": datasets.Dataset.from_list(valid),
+            "train": _to_dataset(train),
+            "valid": _to_dataset(valid),
         }
     )
+
+
+def _to_dataset(tables):
+    if not tables:
+        return datasets.Dataset.from_list([])
+    return datasets.Dataset(concat_tables(tables))
+
+
+def raw():
+    dataset = raw_dataset()
+    logging.info("Pushing to Hugging Face Datasets.")
     dataset.push_to_hub("u1537782/PTradutor", "raw")
 
 
-def clean():
-    """Push the clean version of the dataset.
-    NOTE: It requires that the raw version is already pushed to the hub.
-    """
-    trainset = datasets.load_dataset("u1537782/PTradutor", name="raw", split="train")
-    trainset = drop_duplicates(trainset)
-    trainset = drop_duplicates_start_ends(trainset)
-    trainset = huggingface_dataset_transform(trainset)
-    trainset = huggingface_dataset_filter(trainset)
+def raw_stream():
+    """The train split of the raw subset, streamed from the hub."""
+    return datasets.load_dataset(
+        "u1537782/PTradutor", name="raw", split="train", streaming=True
+    )
+
+
+def stream_superclean(rows):
+    yield from stream_drop_justext_bad_class(stream_clean(rows))
+
+
+def clean_stages(near_dedup=False):
+    stages = [
+        Stage("duplicates", drop_duplicates),
+        Stage("duplicates_start_ends", drop_duplicates_start_ends, n_chars=60),
+    ]
+    if near_dedup:
+        stages.append(Stage("near_duplicates", drop_near_duplicates, threshold=0.8))
+    stages += [
+        Stage("transform", huggingface_dataset_transform),
+        Stage("n_tokens", add_n_tokens),
+        Stage("filter", huggingface_dataset_filter),
+    ]
+    return stages
+
+
+def push(trainset, subset):
     validset = datasets.load_dataset("u1537782/PTradutor", name="raw", split="valid")
     dataset = datasets.DatasetDict(
         {
@@ -61,33 +115,95 @@ def clean():
             "valid": validset
         }
     )
-    dataset.push_to_hub("u1537782/PTradutor", "clean")
+    dataset.push_to_hub("u1537782/PTradutor", subset)
+
 
+def clean(
+    near_dedup: bool = False,
+    streaming: bool = False,
+    upload: bool = True,
+    force: bool = False,
+):
+    """Push the clean version of the dataset.
+    NOTE: It requires that the raw version is already pushed to the hub.
 
-def superclean():
-    """Push the superclean version of the dataset.
-    NOTE: It requires that the `clean` version is already pushed to the hub.
+    near_dedup: also drop the near-duplicates found with MinHash-LSH.
+    streaming: stream the raw dataset through the pipeline in a single pass.
+    upload: push the result to the hub. Without it, the stages are only run and
+        saved in `data/pipeline`.
+    force: rerun all the stages, even those whose saved output is up to date.
+
+    The time, rows and memory of each stage and the cost and rejections of each
+    filter are saved in `data/reports/clean_profile.{json,csv}`.
     """
-    trainset = datasets.load_dataset("u1537782/PTradutor", name="clean", split="train")
-    trainset = drop_justext_bad_class(trainset)
-    validset = datasets.load_dataset("u1537782/PTradutor", name="clean", split="valid")
-    dataset = datasets.DatasetDict(
-        {
-            "train": trainset,
-            "valid": validset
-        }
-    )
-    dataset.push_to_hub("u1537782/PTradutor", "superclean")
+    if streaming and near_dedup:
+        raise ValueError("Near-duplicate removal is not supported when streaming.")
+
+    profiler = Profiler()
+    if streaming:
+        with profiler.stage("stream_clean") as record:
+            trainset = from_stream(stream_clean, raw_stream(), force=force)
+            record["rows_out"] = len(trainset)
+    else:
+        trainset = datasets.load_dataset(
+            "u1537782/PTradutor", name="raw", split="train"
+        )
+        stages = clean_stages(near_dedup)
+        trainset = Pipeline(stages).run(trainset, force, profiler)
+    profiler.save(REPORTS_PATH / "clean_profile")
+    logging.info(f"Clean train set: {len(trainset)} rows.")
+    if upload:
+        push(trainset, "clean")
+
+
+def superclean(
+    near_dedup: bool = False,
+    streaming: bool = False,
+    upload: bool = True,
+    force: bool = False,
+):
+    """Push the superclean version of the dataset: the clean version without the
+    entries deemed bad by justext.
+    NOTE: It requires that the raw version is already pushed to the hub. The
+    clean stages are shared with `clean`, so their saved output is reused.
+
+    Same arguments as `clean`.
+    """
+    if streaming and near_dedup:
+        raise ValueError("Near-duplicate removal is not supported when streaming.")
+
+    profiler = Profiler()
+    if streaming:
+        with profiler.stage("stream_superclean") as record:
+            trainset = from_stream(stream_superclean, raw_stream(), force=force)
+            record["rows_out"] = len(trainset)
+    else:
+        trainset = datasets.load_dataset(
+            "u1537782/PTradutor", name="raw", split="train"
+        )
+        stages = clean_stages(near_dedup)
+        stages.append(Stage("justext", drop_justext_bad_class))
+        trainset = Pipeline(stages).run(trainset, force, profiler)
+    profiler.save(REPORTS_PATH / "superclean_profile")
+    logging.info(f"Superclean train set: {len(trainset)} rows.")
+    if upload:
+        push(trainset, "superclean")
 
 
-def main(subset: str = "raw"):
+def main(
+    subset: str = "raw",
+    near_dedup: bool = False,
+    streaming: bool = False,
+    upload: bool = True,
+    force: bool = False,
+):
     match subset:
         case "raw":
             raw()
         case "clean":
-            clean()
+            clean(near_dedup, streaming, upload, force)
         case "superclean":
-            superclean()
+            superclean(near_dedup, streaming, upload, force)
         case _:
             raise ValueError(f"Subset {subset} not found.")
 
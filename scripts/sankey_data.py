@@ -1,26 +1,23 @@
+import json
 import multiprocessing as mp
+from collections import Counter
 
 import datasets
+import numpy as np
 import plotly.graph_objects as go
+from fire import Fire
 
 from src.process import (
-    bad_translation,
-    drop_duplicates,
-    drop_duplicates_start_ends,
-    has_invalid_character,
-    has_invalid_end,
-    has_invalid_middle,
-    has_invalid_start,
-    has_more_than_three_points,
-    has_too_long_word,
-    has_valid_brackets,
-    has_valid_quotes,
+    REJECTION_FILTERS,
+    get_justext_stoplist,
+    get_unique_idxs,
+    get_unique_start_ends_idxs,
     huggingface_dataset_transform,
-    is_empty,
-    starts_with_month,
-    valid_n_tokens,
-    drop_justext_bad_class
+    is_good_quality_batch,
+    rejection_stats,
+    tag_rejection_reasons,
 )
+from src.profiling import REPORTS_PATH, Profiler
 
 N_PROC = mp.cpu_count()
 DOMAINS = [
@@ -33,113 +30,143 @@ DOMAINS = [
     "social_media",
 ]
 
-
-def print_n_docs_by_domain(dataset):
+# Stages of the pipeline, in order, and the stage of every rejection reason.
+STAGES = [
+    "Raw",
+    "justext filter",
+    "Duplicates and patterns",
+    "Max tokens",
+    "Invalid Chars",
+    "Patterns",
+    "MISC",
+]
+REASON_STAGES = {
+    "justext": "justext filter",
+    "duplicates": "Duplicates and patterns",
+    "max_tokens": "Max tokens",
+    "invalid_chars": "Invalid Chars",
+    "patterns": "Patterns",
+    "misc": "MISC",
+}
+assert set(REJECTION_FILTERS) <= set(REASON_STAGES)
+
+STATS_PATH = REPORTS_PATH / "sankey_stats.json"
+
+
+def reject(reasons, idxs, keep_idxs, reason):
+    """Set `reason` for the rows of `idxs` that are not in `keep_idxs`."""
+    rejected = np.ones(len(idxs), dtype=bool)
+    rejected[keep_idxs] = False
+    reasons[idxs[rejected]] = reason
+
+
+def accepted(reasons):
+    return np.flatnonzero(np.equal(reasons, None))
+
+
+def rejection_reasons(dataset, profiler=None):
+    """Tag every row with the first stage that drops it (`None` if it is kept).
+
+    Every stage only looks at the rows accepted by the previous ones, as the
+    `clean` pipeline does, and each stage goes over the data once. With a
+    `profiler`, the stages and the filters are recorded.
+    """
+    profiler = Profiler() if profiler is None else profiler
+    reasons = np.full(len(dataset), None, dtype=object)
+
+    idxs = accepted(reasons)
+    with profiler.stage("justext", len(idxs)) as record:
+        # The classifier of `drop_justext_bad_class`, so the counts match `clean`.
+        get_justext_stoplist()
+        good = dataset.select_columns(["pt"]).map(
+            lambda batch: {"good": is_good_quality_batch(batch)},
+            input_columns=["pt"],
+            remove_columns=["pt"],
+            batched=True,
+            num_proc=N_PROC,
+        )["good"]
+        reject(reasons, idxs, np.flatnonzero(good), "justext")
+        record["rows_out"] = len(accepted(reasons))
+
+    idxs = accepted(reasons)
+    with profiler.stage("duplicates", len(idxs)) as record:
+        keep_idxs = get_unique_idxs(dataset.select(idxs))
+        reject(reasons, idxs, keep_idxs, "duplicates/exact")
+        record["rows_out"] = len(keep_idxs)
+
+    idxs = accepted(reasons)
+    with profiler.stage("duplicates_start_ends", len(idxs)) as record:
+        keep_idxs = get_unique_start_ends_idxs(dataset.select(idxs))
+        reject(reasons, idxs, keep_idxs, "duplicates/start_end")
+        record["rows_out"] = len(keep_idxs)
+
+    idxs = accepted(reasons)
+    if len(idxs):
+        with profiler.stage("transform", len(idxs)) as record:
+            transformed = huggingface_dataset_transform(dataset.select(idxs))
+            record["rows_out"] = len(transformed)
+        with profiler.stage("filter", len(idxs)) as record:
+            tagged = tag_rejection_reasons(transformed, timed=True)
+            reasons[idxs] = tagged["rejection_reason"]
+            record["rows_out"] = len(accepted(reasons))
+        profiler.add_predicates(rejection_stats(tagged))
+    return reasons
+
+
+def docs_by_stage(counts):
+    """Number of documents of each domain left after each stage, from the
+    (domain, reason) counts."""
+    totals = Counter()
+    rejected = Counter()
+    for (domain, reason), n_docs in counts.items():
+        totals[domain] += n_docs
+        if reason is not None:
+            rejected[domain, REASON_STAGES[reason.split("/")[0]]] += n_docs
+
+    stats = {}
     for domain in DOMAINS:
-        ds = dataset.filter(lambda x: x["domain"] == domain, num_proc=N_PROC)
-        print(f"{domain:<15} {len(ds)}")
-
-
-def drop_more_than_900_tokens(dataset):
-    return dataset.filter(
-        lambda x: valid_n_tokens(f"{x['pt']} {x['en']}"),
-        num_proc=mp.cpu_count(),
-    )
-
-
-def drop_patterns(dataset):
-    return dataset.filter(
-        lambda x: not starts_with_month(x["en"])
-        and not has_invalid_start(x["en"])
-        and not has_invalid_middle(x["en"])
-        and not has_invalid_end(x["en"])
-        and not has_invalid_end(x["pt"])
-        and not has_more_than_three_points(x["en"])
-        and not has_more_than_three_points(x["pt"]),
-        num_proc=mp.cpu_count(),
-    )
-
-
-def drop_invalid_chars(dataset):
-    return dataset.filter(
-        lambda x: not has_invalid_character(x["pt"]),
-        num_proc=mp.cpu_count(),
-    )
-
-
-def drop_misc(dataset):
-    return dataset.filter(
-        lambda x: not bad_translation(x["pt"], x["en"])
-        and not has_too_long_word(x["en"])
-        and not has_too_long_word(x["pt"])
-        and not is_empty(x["pt"])
-        and has_valid_brackets(x["pt"])
-        and has_valid_quotes(x["pt"]),
-        num_proc=mp.cpu_count(),
-    )
+        n_docs = totals[domain]
+        stats[domain] = [n_docs]
+        for stage in STAGES[1:]:
+            n_docs -= rejected[domain, stage]
+            stats[domain].append(n_docs)
+    return stats
 
 
 def compute_stats():
-    print("Raw")
-    raw = datasets.concatenate_datasets([datasets.load_dataset("u1537782/PTradutor", "raw", split=split) for split in ["train", "valid"]])
-    print_n_docs_by_domain(raw)
-    
-    print("justext filter")
-    raw = drop_justext_bad_class(raw)
-    print_n_docs_by_domain(raw)    
-    
-    print("\nDuplicates and patterns")
-    raw = drop_duplicates(raw)
-    raw = drop_duplicates_start_ends(raw)
-    raw = huggingface_dataset_transform(raw)
-    print_n_docs_by_domain(raw)
-
-    print("\nMax tokens")
-    raw = drop_more_than_900_tokens(raw)
-    print_n_docs_by_domain(raw)
-
-    print("\nInvalid Chars")
-    raw = drop_invalid_chars(raw)
-    print_n_docs_by_domain(raw)
-
-    print("\nPatterns")
-    raw = drop_patterns(raw)
-    print_n_docs_by_domain(raw)
-
-    print("\nMISC")
-    raw = drop_misc(raw)
-    print_n_docs_by_domain(raw)
-
-
-def make_plot():
-    
-
-    # Define the data
-    labels = ["default", "journalistic", "literature", "web", "politics", "legal", "social_media",
-            "Raw", "Duplicates and patterns", "Max tokens", "Invalid Chars", "Patterns", "MISC"]
-
-    # Define the source and target nodes
-    sources = [0, 1, 2, 3, 4, 5, 6,  # Raw to each category
-            0, 1, 2, 3, 4, 5, 6,  # Duplicates and patterns to each category
-            0, 1, 2, 3, 4, 5, 6,  # Max tokens to each category
-            0, 1, 2, 3, 4, 5, 6,  # Invalid Chars to each category
-            0, 1, 2, 3, 4, 5, 6,  # Patterns to each category
-            0, 1, 2, 3, 4, 5, 6]  # MISC to each category
-
-    targets = [7, 7, 7, 7, 7, 7, 7,  # Raw to Raw
-            8, 8, 8, 8, 8, 8, 8,  # Duplicates and patterns to Duplicates and patterns
-            9, 9, 9, 9, 9, 9, 9,  # Max tokens to Max tokens
-            10, 10, 10, 10, 10, 10, 10,  # Invalid Chars to Invalid Chars
-            11, 11, 11, 11, 11, 11, 11,  # Patterns to Patterns
-            12, 12, 12, 12, 12, 12, 12]  # MISC to MISC
-
-    # Define the values for each flow
-    values = [1331, 1414884, 22258, 49758, 1771, 461784, 2014752,  # Raw values
-            1329, 1386299, 22254, 26690, 1522, 414099, 1961379,  # Duplicates and patterns values
-            1329, 1386097, 22254, 17892, 1362, 414068, 1922738,  # Max tokens values
-            1268, 1383164, 22218, 15230, 1321, 414067, 1738837,  # Invalid Chars values
-            1245, 1330431, 17629, 13657, 1097, 388182, 1686355,  # Patterns values
-            1171, 1296965, 17181, 12624, 757, 332851, 1403514]   # MISC values
+    raw = datasets.concatenate_datasets(
+        [
+            datasets.load_dataset("u1537782/PTradutor", "raw", split=split)
+            for split in ["train", "valid"]
+        ]
+    )
+    profiler = Profiler()
+    reasons = rejection_reasons(raw, profiler)
+    profiler.save(REPORTS_PATH / "sankey_profile")
+    counts = Counter(zip(raw["domain"], reasons))
+
+    print("Rejections")
+    for (domain, reason), n_docs in sorted(counts.items(), key=str):
+        print(f"{domain:<15} {str(reason):<40} {n_docs}")
+
+    stats = docs_by_stage(counts)
+    for idx, stage in enumerate(STAGES):
+        print(f"\n{stage}")
+        for domain in DOMAINS:
+            print(f"{domain:<15} {stats[domain][idx]}")
+    return stats
+
+
+def make_plot(stats):
+    labels = DOMAINS + STAGES
+
+    # One link from every domain to every stage.
+    sources, targets, values = [], [], []
+    for stage_idx, _ in enumerate(STAGES):
+        for domain_idx, domain in enumerate(DOMAINS):
+            sources.append(domain_idx)
+            targets.append(len(DOMAINS) + stage_idx)
+            values.append(stats[domain][stage_idx])
 
     # Create the Sankey diagram
     fig = go.Figure(data=[go.Sankey(
@@ -160,6 +187,19 @@ def make_plot():
     fig.show()
 
 
+def main(plot: bool = False):
+    """Compute the number of documents of each domain left after each stage and
+    save them to `data/reports/sankey_stats.json`. The profiling report of the
+    stages is saved to `data/reports/sankey_profile.{json,csv}`.
+
+    plot: also show the Sankey diagram.
+    """
+    stats = compute_stats()
+    STATS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    json.dump({"stages": STAGES, "docs": stats}, STATS_PATH.open("w"), indent=4)
+    if plot:
+        make_plot(stats)
+
 
 if __name__ == "__main__":
-    compute_stats()
+    Fire(main)
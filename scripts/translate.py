@@ -3,15 +3,39 @@ import logging
 from fire import Fire
 from tqdm import tqdm
 
+from src.cache import TranslationCache, cache_path
 from src.data import TranslationDataset, load_dataset
+from src.ratelimit import Retry, TokenBucket
+from src.telemetry import METRICS_PATH, Metrics, report
 from src.translator import Translator
 
 logging.basicConfig(level=logging.INFO)
 
 
-def main(lang="en", name="dsl_tl", domain="default", split="train"):
+def main(
+    lang="en",
+    name="dsl_tl",
+    domain="default",
+    split="train",
+    checkpoint="journal",
+    backend="google",
+    cache=True,
+    rate=None,
+    max_retries=5,
+    metrics_port=None,
+    metrics_interval=10.0,
+):
     """
     name = ["pt_vid", "dsl_tl"]
+    checkpoint = ["journal", "json", "arrow"]
+    backend = ["google", "identity", "reverse", "dictionary"]
+    cache: reuse translations from the cache shared by all datasets.
+    rate: maximum number of requests per second (unlimited by default).
+    max_retries: number of retries of a failed request, with exponential backoff.
+    metrics_port: serve the translation metrics in the Prometheus text format at
+        http://127.0.0.1:<metrics_port>/metrics.
+    metrics_interval: seconds between writes of the metrics to
+        `data/metrics/<dataset>.json`.
 
     Run the following commands to translate the datasets:
 
@@ -24,7 +48,17 @@ def main(lang="en", name="dsl_tl", domain="default", split="train"):
     python scripts/translate.py -l "en" -n "dsl_tl" -d "default" -s "train"
     python scripts/translate.py -l "en" -n "dsl_tl" -d "default" -s "test"
     """
-    translator = Translator(source="pt", target=lang)
+    translation_cache = TranslationCache(cache_path(backend)) if cache else None
+    metrics = Metrics()
+    translator = Translator(
+        source="pt",
+        target=lang,
+        backend=backend,
+        cache=translation_cache,
+        rate_limiter=TokenBucket(rate) if rate else None,
+        retry=Retry(max_retries),
+        metrics=metrics,
+    )
 
     logging.info(f"Loading dataset {name}.")
     dataset = load_dataset(name)
@@ -32,32 +66,39 @@ def main(lang="en", name="dsl_tl", domain="default", split="train"):
 
     ds_name = f"{lang}_{name}_{domain}_{split}"
     logging.info(f"Creating dataset {ds_name}. (loading in case it exists)")
-    translation_ds = TranslationDataset(ds_name)
+    translation_ds = TranslationDataset(ds_name, storage=checkpoint)
 
     logging.info(f"Translating dataset {name}.")
-    for idx, text in tqdm(enumerate(texts)):
-        if idx not in translation_ds:
-            try:
-                translate = translator.translate(text)
-                data = {
-                    "idx": idx,
-                    "source": name,
-                    "domain": domain,
-                    "split": split,
-                    "pt": text,
-                    "en": translate,
-                }
-                translation_ds.add(idx, data)
-            except Exception as e:
-                print(f"Error translating {idx}: {e}")
-        else:
-            logging.info(f"Skipping {idx}.")
+    metrics_path = METRICS_PATH / f"{ds_name}.json"
+    with report(metrics, metrics_path, metrics_port, metrics_interval):
+        for idx, text in tqdm(enumerate(texts)):
+            if idx not in translation_ds:
+                try:
+                    translate = translator.translate(text)
+                    data = {
+                        "idx": idx,
+                        "source": name,
+                        "domain": domain,
+                        "split": split,
+                        "pt": text,
+                        "en": translate,
+                    }
+                    translation_ds.add(idx, data)
+                except Exception as e:
+                    print(f"Error translating {idx}: {e}")
+            else:
+                logging.info(f"Skipping {idx}.")
 
-        if idx % 100 == 0:
-            logging.info(f"Saving dataset {ds_name}.")
-            translation_ds.save()
+            if idx % 100 == 0:
+                logging.info(f"Saving dataset {ds_name}.")
+                translation_ds.save()
 
     translation_ds.save()
+    translation_ds.compact()
+
+    if translation_cache is not None:
+        logging.info(f"Cache stats: {translation_cache.stats}")
+        translation_cache.close()
 
 
 if __name__ == "__main__":
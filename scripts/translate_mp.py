@@ -1,21 +1,79 @@
-import concurrent.futures
+import asyncio
 import logging
+import time
 
 from fire import Fire
 from tqdm import tqdm
 
-from src.data import TranslationDataset, load_dataset
+from src.cache import TranslationCache, cache_path
+from src.data import (
+    TranslationDataset,
+    in_part,
+    load_dataset,
+    parse_part,
+    shard_name,
+    shards_path,
+    worker_name,
+)
+from src.ratelimit import AIMDLimiter, Retry, TokenBucket
+from src.telemetry import METRICS_PATH, Metrics, report
 from src.translator import Translator
+from src.workqueue import LEASE_SECONDS, RANGE_SIZE, WorkQueue, queue_path, worker_id
 
 logging.basicConfig(level=logging.INFO)
 
 
-BATCH_SIZE = 1_000
-
-
-def main(lang="en", name="pt_vid", domain="journalistic", split="train"):
+SAVE_EVERY = 1_000
+
+# Seconds between checks for expired leases once the queue has no pending ranges.
+POLL_SECONDS = 30
+
+
+def main(
+    lang="en",
+    name="pt_vid",
+    domain="journalistic",
+    split="train",
+    checkpoint="journal",
+    backend="google",
+    cache=True,
+    concurrency=5,
+    max_concurrency=32,
+    rate=None,
+    max_retries=5,
+    pack=False,
+    metrics_port=None,
+    metrics_interval=10.0,
+    part=None,
+    queue=False,
+    worker=None,
+    queue_lease=LEASE_SECONDS,
+    queue_range=RANGE_SIZE,
+):
     """
     name = ["pt_vid", "dsl_tl"]
+    checkpoint = ["journal", "json", "arrow"]
+    backend = ["google", "identity", "reverse", "dictionary"]
+    cache: reuse translations from the cache shared by all datasets.
+    concurrency: initial number of translation requests in flight. It is raised
+        on successes and lowered on failures, up to `max_concurrency`.
+    rate: maximum number of requests per second (unlimited by default).
+    max_retries: number of retries of a failed request, with exponential backoff.
+    pack: send consecutive short texts in a single request.
+    metrics_port: serve the translation metrics in the Prometheus text format at
+        http://127.0.0.1:<metrics_port>/metrics.
+    metrics_interval: seconds between writes of the metrics to
+        `data/metrics/<dataset>.json`.
+    part: "i/N" to only translate the ids with `id % N == i`, into
+        `data/shards/<dataset>.part-i-of-N.json`. Ids already in the dataset are
+        skipped. Run `scripts/merge_shards.py` once the N parts are done.
+    queue: lease ranges of `queue_range` ids from the queue of the dataset in
+        `data/queues/<dataset>.sqlite`, shared by any number of workers, and
+        write the translations to `data/shards/<dataset>.worker-<worker>.json`.
+        A lease that isn't renewed within `queue_lease` seconds (e.g. the worker
+        died) is handed out again. Run `scripts/merge_shards.py --queue` once the
+        queue is done.
+    worker: name of the worker in the queue, the host name and pid by default.
 
     Run the following commands to translate the datasets:
 
@@ -27,50 +85,155 @@ def main(lang="en", name="pt_vid", domain="journalistic", split="train"):
     python scripts/translate_mp.py -l "en" -n "pt_vid" -d "web" -s "train"
     python scripts/translate_mp.py -l "en" -n "dsl_tl" -d "default" -s "train"
     python scripts/translate_mp.py -l "en" -n "dsl_tl" -d "default" -s "test"
-    """
-    translator = Translator(source="pt", target=lang)
 
-    def translate(text):
-        try:
-            translate = translator(text)
-            return translate
-        except Exception as e:
-            logging.error(f"Error translating {text}: {e}")
+    To split a dataset across four machines, run on machine i (0 to 3):
+
+    python scripts/translate_mp.py -l "en" -n "pt_vid" -d "web" -s "train" --part i/4
+
+    Or start any number of workers, on this machine or later, that share a queue:
+
+    python scripts/translate_mp.py -l "en" -n "pt_vid" -d "web" -s "train" --queue
+    """
+    if part is not None and queue:
+        raise ValueError("Choose either --part or --queue to split the dataset")
+
+    translation_cache = TranslationCache(cache_path(backend)) if cache else None
+    concurrency_limiter = AIMDLimiter(initial=concurrency, maximum=max_concurrency)
+    metrics = Metrics()
+    translator = Translator(
+        source="pt",
+        target=lang,
+        backend=backend,
+        cache=translation_cache,
+        rate_limiter=TokenBucket(rate) if rate else None,
+        concurrency_limiter=concurrency_limiter,
+        retry=Retry(max_retries),
+        metrics=metrics,
+    )
 
     logging.info(f"Translating dataset {name}.")
     dataset = load_dataset(name)
-    translation_ds = TranslationDataset(f"{lang}_{name}_{domain}_{split}")
-
-    logging.info("Filtering missing translations.")
+    ds_name = f"{lang}_{name}_{domain}_{split}"
     texts = dataset[domain][split]
     ids = list(range(len(dataset[domain][split])))
-    missing_ids = list(set(ids) - set(map(int, translation_ds.ids)))
-    texts = [texts[idx] for idx in missing_ids]
+    done_ids = set()
+    if queue:
+        worker = worker or worker_id()
+        logging.info(f"Joining the queue of {ds_name} as worker {worker}.")
+        work_queue = WorkQueue(queue_path(ds_name))
+        work_queue.populate(len(ids), queue_range)
+        done_ids = set(map(int, TranslationDataset(ds_name).ids))
+        translation_ds = TranslationDataset(
+            worker_name(ds_name, worker),
+            storage=checkpoint,
+            directory=shards_path(),
+        )
+    elif part is None:
+        translation_ds = TranslationDataset(ds_name, storage=checkpoint)
+    else:
+        index, count = parse_part(part)
+        logging.info(f"Translating part {index} of {count}.")
+        ids = [idx for idx in ids if in_part(idx, index, count)]
+        done_ids = set(map(int, TranslationDataset(ds_name).ids))
+        translation_ds = TranslationDataset(
+            shard_name(ds_name, index, count),
+            storage=checkpoint,
+            directory=shards_path(),
+        )
 
-    logging.info("Batching the data.")
-    bids = [
-        missing_ids[i : i + BATCH_SIZE] for i in range(0, len(missing_ids), BATCH_SIZE)
-    ]
-    btexts = [texts[i : i + BATCH_SIZE] for i in range(0, len(texts), BATCH_SIZE)]
+    logging.info("Filtering missing translations.")
+    done_ids |= set(map(int, translation_ds.ids))
+    missing_ids = sorted(set(ids) - done_ids)
+    items = ((idx, texts[idx]) for idx in missing_ids)
+
+    # Number of ids left in each leased range, and the range of each id in flight.
+    remaining, ranges = {}, {}
+
+    def leased_items():
+        while (leased := work_queue.acquire(worker, queue_lease)) is not None:
+            start, stop = leased
+            range_ids = [idx for idx in range(start, stop) if idx not in done_ids]
+            remaining[start] = len(range_ids)
+            if not range_ids:
+                complete(start)
+            for idx in range_ids:
+                ranges[idx] = start
+                yield idx, texts[idx]
+
+    def complete(start):
+        translation_ds.save()
+        work_queue.complete(start)
+        del remaining[start]
+
+    async def renew_leases():
+        # Renew on a timer rather than on results, so a stall (backoff retries, a
+        # slow request) doesn't let the leases expire while the worker is alive.
+        while True:
+            await asyncio.sleep(queue_lease / 3)
+            work_queue.renew(worker, queue_lease)
+
+    async def run(items):
+        if queue:
+            renewer = asyncio.create_task(renew_leases())
+        try:
+            await translate(items)
+        finally:
+            if queue:
+                renewer.cancel()
+
+    async def translate(items):
+        n_done = 0
+        async for idx, text, result in translator.stream(items, max_concurrency, pack):
+            if result:
+                data = {
+                    "idx": idx,
+                    "source": name,
+                    "domain": domain,
+                    "split": split,
+                    "pt": text,
+                    "en": result,
+                }
+                translation_ds.add(idx, data)
+
+            n_done += 1
+            pbar.update()
+            if n_done % SAVE_EVERY == 0:
+                logging.debug(f"Concurrency limit: {concurrency_limiter.limit}.")
+                logging.debug("Saving the dataset.")
+                translation_ds.save()
+
+            if queue:
+                start = ranges.pop(idx)
+                remaining[start] -= 1
+                if not remaining[start]:
+                    complete(start)
 
     logging.info("Translating texts.")
-    for bid, btext in tqdm(zip(bids, btexts), total=len(bids)):
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            results = executor.map(translate, btext)
-            for idx, text, result in zip(bid, btext, results):
-                if result:
-                    data = {
-                        "idx": idx,
-                        "source": name,
-                        "domain": domain,
-                        "split": split,
-                        "pt": text,
-                        "en": result,
-                    }
-                    translation_ds.add(idx, data)
-
-        logging.debug("Saving the dataset.")
-        translation_ds.save()
+    metrics_path = METRICS_PATH / f"{translation_ds.name}.json"
+    with report(metrics, metrics_path, metrics_port, metrics_interval):
+        if not queue:
+            with tqdm(total=len(missing_ids)) as pbar:
+                asyncio.run(run(items))
+        else:
+            try:
+                with tqdm() as pbar:
+                    while True:
+                        asyncio.run(run(leased_items()))
+                        if work_queue.finished:
+                            break
+                        logging.info("Waiting for the leases of other workers.")
+                        time.sleep(POLL_SECONDS)
+            finally:
+                translation_ds.save()
+                work_queue.release(worker)
+                work_queue.close()
+
+    translation_ds.save()
+    translation_ds.compact()
+
+    if translation_cache is not None:
+        logging.info(f"Cache stats: {translation_cache.stats}")
+        translation_cache.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,103 @@
+import re
+from typing import Dict, Protocol
+
+from src.constants import RESOURCES_PATH
+
+WORD_RE = re.compile(r"\w+(?:-\w+)*")
+
+
+class Backend(Protocol):
+    """A translation service that `Translator` dispatches requests to.
+
+    Backends raise `TransientError` for failures worth retrying.
+    """
+
+    def translate(self, text: str) -> str: ...
+
+
+class TransientError(Exception):
+    """The request was throttled or hit a temporary server or network problem."""
+
+
+class GoogleBackend:
+    def __init__(self, source: str, target: str) -> None:
+        import requests
+        from deep_translator import GoogleTranslator
+        from deep_translator.exceptions import RequestError, TooManyRequests
+
+        self._engine = GoogleTranslator(source=source, target=target)
+        # deep_translator raises RequestError for any non-2xx response without
+        # its status, so it can't tell 5xx from 4xx; we retry it.
+        self._transient_errors = (TooManyRequests, RequestError, requests.Timeout)
+
+    def translate(self, text: str) -> str:
+        try:
+            return self._engine.translate(text)
+        except self._transient_errors as e:
+            raise TransientError(str(e) or type(e).__name__) from e
+
+
+class IdentityBackend:
+    """Offline backend that returns the text unchanged."""
+
+    def __init__(self, source: str, target: str) -> None:
+        pass
+
+    def translate(self, text: str) -> str:
+        return text
+
+
+class ReverseBackend:
+    """Offline backend that returns the text reversed."""
+
+    def __init__(self, source: str, target: str) -> None:
+        pass
+
+    def translate(self, text: str) -> str:
+        return text[::-1]
+
+
+class DictionaryBackend:
+    """Offline backend that translates word by word with a lexicon.
+
+    Each line of the lexicon is a word optionally followed by a tab and its
+    translation. Words without a translation, as well as words missing from the
+    lexicon, are kept as they are. `resources/pt_words.txt` only lists words, so
+    with the default lexicon the output equals the input but every word still
+    goes through a lookup.
+    """
+
+    def __init__(
+        self, source: str, target: str, path=RESOURCES_PATH / "pt_words.txt"
+    ) -> None:
+        self._lexicon = self._load_lexicon(path)
+
+    @staticmethod
+    def _load_lexicon(path) -> Dict[str, str]:
+        lexicon = {}
+        for line in path.read_text().splitlines():
+            word, _, translation = line.partition("\t")
+            if word:
+                lexicon[word.lower()] = translation
+        return lexicon
+
+    def _lookup(self, match: re.Match) -> str:
+        word = match.group()
+        return self._lexicon.get(word.lower()) or word
+
+    def translate(self, text: str) -> str:
+        return WORD_RE.sub(self._lookup, text)
+
+
+BACKENDS = {
+    "google": GoogleBackend,
+    "identity": IdentityBackend,
+    "reverse": ReverseBackend,
+    "dictionary": DictionaryBackend,
+}
+
+
+def get_backend(name: str, source: str, target: str) -> Backend:
+    if name not in BACKENDS:
+        raise ValueError(f"Backend {name} not found")
+    return BACKENDS[name](source=source, target=target)
@@ -0,0 +1,107 @@
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+from src.constants import DATA_PATH
+
+CAPACITY = 100_000
+
+
+def cache_path(backend: str) -> Path:
+    """One store per backend, so that offline backends never feed the real cache."""
+    return DATA_PATH / f"cache_{backend}.sqlite"
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFC", text).strip()
+
+
+def cache_key(text: str, source: str, target: str) -> bytes:
+    content = f"{source}\0{target}\0{normalize(text)}"
+    return hashlib.sha256(content.encode()).digest()
+
+
+class TranslationCache:
+    """Persistent translation cache keyed by (normalized text, source, target).
+
+    Lookups go through an in-memory LRU of `capacity` entries before hitting the
+    SQLite store at `path`, which is shared by every dataset, domain and split.
+    The cache is safe to use from several threads.
+    """
+
+    def __init__(
+        self, path: Path = cache_path("google"), capacity: int = CAPACITY
+    ) -> None:
+        self._capacity = capacity
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations "
+            "(key BLOB PRIMARY KEY, translation TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self) -> dict:
+        n_lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / n_lookups
+            if n_lookups
+            else 0.0,
+        }
+
+    def get(self, text: str, source: str, target: str) -> str | None:
+        key = cache_key(text, source, target)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT translation FROM translations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.disk_hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, text: str, source: str, target: str, translation: str) -> None:
+        key = cache_key(text, source, target)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?)", (key, translation)
+            )
+            self._conn.commit()
+            self._remember(key, translation)
+
+    def _remember(self, key: bytes, translation: str) -> None:
+        self._memory[key] = translation
+        self._memory.move_to_end(key)
+        if len(self._memory) > self._capacity:
+            self._memory.popitem(last=False)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
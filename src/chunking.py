@@ -0,0 +1,40 @@
+from typing import List
+
+# Boundaries to split on, from the coarsest to the finest.
+SEPARATORS = ["\n", ". ", " "]
+
+
+def _segments(text: str, max_chars: int, separators: List[str]) -> List[str]:
+    """Split the text into segments of at most `max_chars`, using the coarsest
+    separator that is enough. Segments keep their trailing separator."""
+    if len(text) <= max_chars:
+        return [text]
+    if not separators:
+        return [text[i : i + max_chars] for i in range(0, len(text), max_chars)]
+
+    separator, finer = separators[0], separators[1:]
+    pieces = text.split(separator)
+    segments = []
+    for idx, piece in enumerate(pieces):
+        if idx < len(pieces) - 1:
+            piece += separator
+        segments.extend(_segments(piece, max_chars, finer))
+    return segments
+
+
+def chunk(text: str, max_chars: int) -> List[str]:
+    """Split a text into as few chunks of at most `max_chars` as possible.
+
+    Whole paragraphs are greedily packed together, paragraphs that are too long
+    are split into sentences, and sentences that are too long into words.
+    Concatenating the chunks gives back the original text.
+    """
+    chunks, current = [], ""
+    for segment in _segments(text, max_chars, SEPARATORS):
+        if current and len(current) + len(segment) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += segment
+    if current:
+        chunks.append(current)
+    return chunks
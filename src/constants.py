@@ -3,3 +3,4 @@ from pathlib import Path
 ROOT = Path(__file__).parent.parent
 
 DATA_PATH = ROOT / "data"
+RESOURCES_PATH = ROOT / "resources"
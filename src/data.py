@@ -1,21 +1,64 @@
 import json
-from typing import Dict, List
+import logging
+import os
+from typing import Dict, List, Tuple
 
 import datasets
+import pyarrow as pa
+from datasets.table import InMemoryTable, MemoryMappedTable, Table
 
 from src.constants import DATA_PATH
 
 
+STORAGES = ["json", "journal", "arrow"]
+
+# Number of journal records after which the journal is folded into the JSON file.
+COMPACT_EVERY = 100_000
+
+# Columns with a handful of distinct values, dictionary encoded in the Arrow files.
+CATEGORICAL_COLUMNS = ["source", "domain", "split"]
+
+# Suffixes of the files a dataset can be stored in, whatever its storage mode.
+SUFFIXES = [".json", ".jsonl", ".arrow"]
+
+
 class TranslationDataset:
-    def __init__(self, name: str) -> None:
+    """Translated texts indexed by id, persisted under `DATA_PATH` (or `directory`).
+
+    Three storage modes are supported:
+    - "json": every `save` rewrites `{name}.json` with the full content.
+    - "journal": every `save` appends the records added since the previous save
+      to `{name}.jsonl` and the journal is periodically compacted into
+      `{name}.json`. The cost of a save depends only on the new records.
+    - "arrow": saves like "journal", but the journal is compacted into the
+      columnar file `{name}.arrow`, which `translation_table` memory maps.
+
+    Every mode loads the Arrow or JSON file and replays the journal on top of it,
+    so a dataset written in one mode can be read in the other.
+    """
+
+    def __init__(self, name: str, storage: str = "json", directory=None) -> None:
+        if storage not in STORAGES:
+            raise ValueError(f"Storage {storage} not found")
+
+        directory = DATA_PATH if directory is None else directory
+        directory.mkdir(parents=True, exist_ok=True)
         self._name = name
-        self._path = DATA_PATH / f"{name}.json"
+        self._storage = storage
+        self._path = directory / f"{name}.json"
+        self._journal_path = directory / f"{name}.jsonl"
+        self._arrow_path = directory / f"{name}.arrow"
 
-        if self._path.exists():
+        if self._arrow_path.exists():
+            self._data = self._read_arrow()
+        elif self._path.exists():
             self._data = json.load(self._path.open())
         else:
             self._data = {}
 
+        self._pending = {}
+        self._n_journal = self._replay_journal()
+
     @property
     def name(self):
         return self._name
@@ -30,9 +73,102 @@ class TranslationDataset:
 
     def add(self, id: int, data: dict) -> None:
         self._data[id] = data
+        self._pending[id] = data
 
     def save(self) -> None:
-        json.dump(self._data, self._path.open("w"), ensure_ascii=False, indent=4)
+        match self._storage:
+            case "json":
+                self.compact()
+            case "journal" | "arrow":
+                self._append_journal()
+                if self._n_journal >= COMPACT_EVERY:
+                    self.compact()
+
+    def compact(self) -> None:
+        """Write the full content to the JSON (or Arrow) file and drop the journal."""
+        if self._storage == "arrow":
+            path, stale_path = self._arrow_path, self._path
+        else:
+            path, stale_path = self._path, self._arrow_path
+
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        try:
+            with tmp_path.open("wb" if self._storage == "arrow" else "w") as fout:
+                if self._storage == "arrow":
+                    table = self.to_arrow()
+                    with pa.ipc.new_stream(fout, table.schema) as writer:
+                        writer.write_table(table)
+                else:
+                    json.dump(self._data, fout, ensure_ascii=False, indent=4)
+                fout.flush()
+                os.fsync(fout.fileno())
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        os.replace(tmp_path, path)
+        stale_path.unlink(missing_ok=True)
+        self._journal_path.unlink(missing_ok=True)
+        self._pending = {}
+        self._n_journal = 0
+
+    def to_arrow(self) -> pa.Table:
+        """The content as a table with an `id` column and a column per field of
+        the records. The categorical columns are dictionary encoded."""
+        table = pa.Table.from_pylist(list(self._data.values()))
+        for column in CATEGORICAL_COLUMNS:
+            if column in table.column_names:
+                index = table.column_names.index(column)
+                table = table.set_column(
+                    index, column, table[column].combine_chunks().dictionary_encode()
+                )
+        # Ids are strings, as in the JSON file.
+        ids = pa.array([str(id) for id in self._data.keys()], pa.string())
+        return table.add_column(0, "id", ids)
+
+    def _read_arrow(self) -> dict:
+        with pa.memory_map(str(self._arrow_path)) as source:
+            table = pa.ipc.open_stream(source).read_all()
+        ids = table["id"].to_pylist()
+        return dict(zip(ids, table.drop_columns(["id"]).to_pylist()))
+
+    def _append_journal(self) -> None:
+        if not self._pending:
+            return
+        with self._journal_path.open("a") as fout:
+            for id, data in self._pending.items():
+                record = {"id": id, "data": data}
+                fout.write(json.dumps(record, ensure_ascii=False) + "\n")
+            fout.flush()
+            os.fsync(fout.fileno())
+        self._n_journal += len(self._pending)
+        self._pending = {}
+
+    def _replay_journal(self) -> int:
+        """Load the journal records on top of the JSON content.
+
+        A record that was only partially written (e.g. the process was killed
+        mid-save) is truncated so that the following appends stay valid.
+        Ids are loaded as strings to match the keys of the JSON file.
+        """
+        if not self._journal_path.exists():
+            return 0
+
+        n_records, valid_size = 0, 0
+        with self._journal_path.open("rb") as fin:
+            for line in fin:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self._data[str(record["id"])] = record["data"]
+                n_records += 1
+                valid_size += len(line)
+
+        if valid_size < self._journal_path.stat().st_size:
+            os.truncate(self._journal_path, valid_size)
+        return n_records
 
     def __len__(self) -> int:
         return len(self._data)
@@ -44,6 +180,156 @@ class TranslationDataset:
         return id in self._data
 
 
+def translation_table(name: str, directory=None) -> Table:
+    """The dataset `name` as a table ready for `datasets.Dataset`.
+
+    A dataset compacted to Arrow is memory mapped from its file. One stored in
+    JSON or with a journal is loaded and converted in memory; the files are left
+    untouched. The categorical columns are decoded to strings, which `datasets`
+    requires.
+    """
+    directory = DATA_PATH if directory is None else directory
+    path = directory / f"{name}.arrow"
+    if path.exists() and not (directory / f"{name}.jsonl").exists():
+        table = MemoryMappedTable.from_file(str(path))
+    else:
+        dataset = TranslationDataset(name, directory=directory)
+        table = InMemoryTable(dataset.to_arrow())
+
+    schema = pa.schema(
+        [
+            field.with_type(field.type.value_type)
+            if pa.types.is_dictionary(field.type)
+            else field
+            for field in table.schema
+        ]
+    )
+    return table.cast(schema)
+
+
+def shards_path():
+    return DATA_PATH / "shards"
+
+
+def parse_part(part: str) -> Tuple[int, int]:
+    """Parse an "i/N" part specification into `(i, N)`, with `0 <= i < N`."""
+    try:
+        index, count = map(int, str(part).split("/"))
+    except ValueError:
+        raise ValueError(f"Part {part} is not of the form i/N")
+    if not 0 <= index < count:
+        raise ValueError(f"Part {part} is out of range")
+    return index, count
+
+
+def in_part(id: int, index: int, count: int) -> bool:
+    """Source ids are partitioned by their remainder modulo the number of parts,
+    so each part gets an even share of every region of the dataset."""
+    return int(id) % count == index
+
+
+def shard_name(name: str, index: int, count: int) -> str:
+    return f"{name}.part-{index}-of-{count}"
+
+
+def merge_shards(
+    name: str,
+    count: int,
+    expected_ids: List[int] | None = None,
+    allow_gaps: bool = False,
+    storage: str | None = None,
+) -> "TranslationDataset":
+    """Merge the `count` shards of `name` into the dataset `name`.
+
+    Every shard must exist and only hold ids of its own part, so no id can be in
+    two shards. Ids already in the dataset keep their translation. The ids of
+    `expected_ids` that are in neither the shards nor the existing dataset are
+    gaps, which raise unless `allow_gaps` is set (e.g. for texts whose
+    translation failed).
+
+    The dataset is written in the `storage` mode. By default it is "arrow" if the
+    dataset or one of the shards is already an Arrow file, and "json" otherwise.
+    """
+    shards = []
+    for index in range(count):
+        shard = shard_name(name, index, count)
+        paths = [shards_path() / f"{shard}{suffix}" for suffix in SUFFIXES]
+        if not any(path.exists() for path in paths):
+            raise FileNotFoundError(f"Shard {shard} not found in {shards_path()}")
+        shards.append(TranslationDataset(shard, directory=shards_path()))
+
+    for index, shard in enumerate(shards):
+        misplaced = [id for id in shard.ids if not in_part(id, index, count)]
+        if misplaced:
+            raise ValueError(
+                f"Shard {shard.name} has {len(misplaced)} ids of other parts "
+                f"(e.g. {misplaced[:5]})"
+            )
+
+    return _merge(name, shards, expected_ids, allow_gaps, storage)
+
+
+def worker_name(name: str, worker: str) -> str:
+    return f"{name}.worker-{worker}"
+
+
+def merge_workers(
+    name: str,
+    expected_ids: List[int] | None = None,
+    allow_gaps: bool = False,
+    storage: str | None = None,
+) -> "TranslationDataset":
+    """Merge the outputs of the workers of the queue of `name` (see
+    `src.workqueue`) into the dataset `name`.
+
+    A range whose lease expired can be translated by two workers, so the same id
+    may be in several outputs; the translation of the first output is kept, and
+    ids already in the dataset keep theirs.
+    Gaps and the storage mode are handled as in `merge_shards`.
+    """
+    paths = shards_path().glob(f"{worker_name(name, '*')}.*")
+    workers = sorted({path.stem for path in paths if path.suffix in SUFFIXES})
+    if not workers:
+        raise FileNotFoundError(f"No worker outputs of {name} in {shards_path()}")
+    outputs = [
+        TranslationDataset(worker, directory=shards_path()) for worker in workers
+    ]
+    return _merge(name, outputs, expected_ids, allow_gaps, storage)
+
+
+def _merge(name, shards, expected_ids, allow_gaps, storage=None):
+    if storage is None:
+        arrow_paths = [DATA_PATH / f"{name}.arrow"]
+        arrow_paths += [shards_path() / f"{shard.name}.arrow" for shard in shards]
+        storage = "arrow" if any(path.exists() for path in arrow_paths) else "json"
+    merged = TranslationDataset(name, storage=storage)
+    # The translations already in the dataset are kept.
+    seen = set(merged.ids)
+    n_overlaps = 0
+    for shard in shards:
+        for id, data in shard:
+            if id in seen:
+                n_overlaps += 1
+                continue
+            seen.add(id)
+            merged.add(id, data)
+    if n_overlaps:
+        logging.info(
+            f"{n_overlaps} ids were already in {name} or in another output. "
+            "Kept the first translation."
+        )
+
+    if expected_ids is not None:
+        gaps = sorted(set(map(int, expected_ids)) - set(map(int, merged.ids)))
+        if gaps and not allow_gaps:
+            raise ValueError(f"{len(gaps)} ids are missing (e.g. {gaps[:5]})")
+        if gaps:
+            logging.warning(f"{len(gaps)} ids are missing (e.g. {gaps[:5]}).")
+
+    merged.compact()
+    return merged
+
+
 def load_dsl_tl() -> Dict:
     dataset = datasets.load_dataset("LCA-PORVID/dsl_tl")
 
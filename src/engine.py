@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterable, Tuple
+
+_DONE = object()
+
+
+async def translate_stream(
+    translate: Callable[[str], str],
+    items: Iterable[Tuple[int, str]],
+    concurrency: int = 5,
+) -> AsyncIterator[Tuple[int, str, str | None]]:
+    """Translate `(id, text)` items with at most `concurrency` requests in flight.
+
+    The items are consumed lazily from a single work queue and each result is
+    yielded as soon as its request completes, so a slow request only holds up
+    its own worker. The translation is `None` when the request failed.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=2 * concurrency)
+    results = asyncio.Queue()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def producer():
+        try:
+            for item in items:
+                await queue.put(item)
+        finally:
+            for _ in range(concurrency):
+                await queue.put(_DONE)
+
+    async def worker():
+        while (item := await queue.get()) is not _DONE:
+            id, text = item
+            try:
+                translation = await loop.run_in_executor(executor, translate, text)
+            except Exception as e:
+                logging.error(f"Error translating {id}: {e}")
+                translation = None
+            await results.put((id, text, translation))
+        await results.put(_DONE)
+
+    tasks = [asyncio.create_task(producer())]
+    tasks += [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        n_running = concurrency
+        while n_running:
+            result = await results.get()
+            if result is _DONE:
+                n_running -= 1
+            else:
+                yield result
+        await tasks[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,60 @@
+import re
+from typing import Iterable, Iterator, List, Tuple
+
+# Texts are joined with numbered markers, e.g. "first\n[[1]]\nsecond". The
+# numbers let us detect markers that were dropped, merged or reordered by the
+# translation service, in which case the pack has to be translated per item.
+DELIMITER = "\n[[{}]]\n"
+DELIMITER_RE = re.compile(r"\s*\[\[\s*(\d+)\s*\]\]\s*")
+
+MAX_ITEMS = 100
+
+
+def can_pack(text: str) -> bool:
+    return bool(text.strip()) and not DELIMITER_RE.search(text)
+
+
+def pack(
+    items: Iterable[Tuple[int, str]], max_chars: int, max_items: int = MAX_ITEMS
+) -> Iterator[List[Tuple[int, str]]]:
+    """Greedily group consecutive `(id, text)` items so that the packed text of each
+    group fits in `max_chars`. Texts that cannot be packed form a group of their own."""
+    group, size = [], 0
+    for id, text in items:
+        if not can_pack(text) or len(text) > max_chars:
+            if group:
+                yield group
+                group, size = [], 0
+            yield [(id, text)]
+            continue
+
+        delimiter_size = len(DELIMITER.format(len(group))) if group else 0
+        if group and (
+            size + delimiter_size + len(text) > max_chars or len(group) == max_items
+        ):
+            yield group
+            group, size, delimiter_size = [], 0, 0
+        group.append((id, text))
+        size += delimiter_size + len(text)
+
+    if group:
+        yield group
+
+
+def join(texts: List[str]) -> str:
+    packed = texts[0]
+    for idx, text in enumerate(texts[1:], start=1):
+        packed += DELIMITER.format(idx) + text
+    return packed
+
+
+def split(packed: str, n_texts: int) -> List[str] | None:
+    """Split a translated pack back into its texts.
+
+    Returns `None` if the markers do not come back exactly as `1, ..., n_texts - 1`.
+    """
+    parts = DELIMITER_RE.split(packed.strip())
+    texts, markers = parts[::2], parts[1::2]
+    if markers != [str(idx) for idx in range(1, n_texts)]:
+        return None
+    return texts
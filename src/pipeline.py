@@ -0,0 +1,213 @@
+import functools
+import hashlib
+import inspect
+import logging
+import re
+import shutil
+import sysconfig
+import types
+
+import datasets
+from datasets.fingerprint import Hasher
+
+from src.constants import DATA_PATH
+
+PIPELINE_PATH = DATA_PATH / "pipeline"
+
+LIBRARY_PATHS = tuple(
+    {
+        sysconfig.get_paths()[name]
+        for name in ["stdlib", "platstdlib", "purelib", "platlib"]
+    }
+)
+
+
+def _global_names(code):
+    """Global names used by the code object and the functions defined in it."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _global_names(const)
+    return names
+
+
+def describe(obj, seen=None):
+    """Text that changes when the code or the values `obj` depends on change.
+
+    Functions are described by their source and by everything they reference
+    from their module, recursively, so editing a helper or a constant of
+    `src.process` invalidates the stages that use it.
+    """
+    seen = set() if seen is None else seen
+    if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        return repr(obj)
+    if isinstance(obj, re.Pattern):
+        return repr((obj.pattern, obj.flags))
+    if isinstance(obj, (list, tuple)):
+        return "[" + ",".join(describe(item, seen) for item in obj) + "]"
+    if isinstance(obj, dict):
+        items = (f"{key!r}:{describe(value, seen)}" for key, value in obj.items())
+        return "{" + ",".join(items) + "}"
+    if isinstance(obj, functools.partial):
+        return describe([obj.func, obj.args, obj.keywords], seen)
+    if hasattr(obj, "__wrapped__"):
+        return describe(obj.__wrapped__, seen)
+    if isinstance(obj, types.FunctionType):
+        if id(obj) in seen:
+            return obj.__qualname__
+        seen.add(id(obj))
+        try:
+            source = inspect.getsource(obj)
+        except (OSError, TypeError):
+            source = obj.__code__.co_code.hex()
+        references = [
+            f"{name}={describe(obj.__globals__[name], seen)}"
+            for name in sorted(_global_names(obj.__code__))
+            if name in obj.__globals__
+        ]
+        return "\n".join([source, *references])
+    if isinstance(obj, type) and _is_project_code(obj):
+        if id(obj) in seen:
+            return obj.__qualname__
+        seen.add(id(obj))
+        methods = [
+            describe(value, seen)
+            for value in vars(obj).values()
+            if isinstance(value, types.FunctionType)
+        ]
+        return "\n".join([inspect.getsource(obj), *methods])
+    if not isinstance(obj, (type, types.ModuleType, types.BuiltinFunctionType)):
+        # Instances are described by their class.
+        return describe(type(obj), seen)
+    # Modules, library classes and builtins are identified by their name.
+    return getattr(obj, "__qualname__", obj.__name__)
+
+
+def _is_project_code(cls):
+    """Whether the class is defined in a source file outside the Python and
+    site-packages libraries, e.g. in `src`."""
+    try:
+        path = inspect.getsourcefile(cls)
+    except TypeError:
+        return False
+    return path is not None and not path.startswith(LIBRARY_PATHS)
+
+
+def fingerprint(*parts):
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()[:16]
+
+
+class Stage:
+    """A step of the pipeline: `function(dataset, **params)` returns its output.
+
+    If `function` takes a `profiler` argument, the profiler of `Pipeline.run` is
+    passed to it. It isn't one of the `params`, so it doesn't change the
+    fingerprint.
+    """
+
+    def __init__(self, name, function, **params):
+        self.name = name
+        self.function = function
+        self.params = params
+
+    def fingerprint(self, input_fingerprint):
+        """Fingerprint of the output, from the input and the stage code and
+        parameters."""
+        return fingerprint(
+            input_fingerprint,
+            self.name,
+            describe(self.function),
+            describe(self.params),
+        )
+
+    def __call__(self, dataset, profiler=None):
+        params = self.params
+        if profiler is not None and self.takes_profiler:
+            params = {**params, "profiler": profiler}
+        return self.function(dataset, **params)
+
+    @property
+    def takes_profiler(self):
+        return "profiler" in inspect.signature(self.function).parameters
+
+
+class Pipeline:
+    """Run stages in order, saving the output of each stage to disk.
+
+    The output of a stage is stored in `path/<name>-<fingerprint>`. When the
+    pipeline is run again, it resumes from the last stage whose output is up to
+    date, so changing a parameter of the last stage only reruns that stage.
+    """
+
+    def __init__(self, stages, path=PIPELINE_PATH):
+        self.stages = stages
+        self.path = path
+
+    def stage_path(self, stage, fingerprint):
+        return self.path / f"{stage.name}-{fingerprint}"
+
+    def fingerprints(self, dataset):
+        fingerprints = []
+        current = dataset._fingerprint
+        for stage in self.stages:
+            current = stage.fingerprint(current)
+            fingerprints.append(current)
+        return fingerprints
+
+    def run(self, dataset, force=False, profiler=None):
+        """Output of the last stage. With `force` every stage is recomputed. With a
+        `profiler` (see `src.profiling`), every stage that runs is recorded."""
+        paths = [
+            self.stage_path(stage, fingerprint)
+            for stage, fingerprint in zip(self.stages, self.fingerprints(dataset))
+        ]
+
+        start = 0
+        if not force:
+            for idx in reversed(range(len(self.stages))):
+                if paths[idx].exists():
+                    logging.info(
+                        f"Loading stage {self.stages[idx].name} from {paths[idx]}."
+                    )
+                    dataset = datasets.load_from_disk(paths[idx])
+                    start = idx + 1
+                    break
+
+        for stage, path in zip(self.stages[start:], paths[start:]):
+            logging.info(f"Running stage {stage.name}.")
+            if profiler is None:
+                dataset = stage(dataset)
+            else:
+                dataset = profiler.run_stage(
+                    stage.name, functools.partial(stage, profiler=profiler), dataset
+                )
+            dataset = self._save(dataset, path)
+        return dataset
+
+    def _save(self, dataset, path):
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        dataset.save_to_disk(tmp_path)
+        shutil.rmtree(path, ignore_errors=True)
+        tmp_path.rename(path)
+        # Read back the saved copy, so the next stage works on memory-mapped
+        # files instead of the chain of cache files of this stage.
+        return datasets.load_from_disk(path)
+
+
+def from_stream(generator, rows, path=PIPELINE_PATH, force=False):
+    """Dataset of the rows of `generator(rows)`, written to Arrow files as they
+    are produced.
+
+    `datasets` would cache the output by a hash of `generator` that ignores the
+    helpers it calls, so the output is stored in `path/<name>-<fingerprint>`,
+    from the hash of `rows` and the description of `generator` as for a stage.
+    With `force` it is recomputed.
+    """
+    key = fingerprint(Hasher.hash(rows), describe(generator))
+    cache_dir = path / f"{generator.__name__}-{key}"
+    if force:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return datasets.Dataset.from_generator(
+        generator, cache_dir=str(cache_dir), gen_kwargs={"rows": rows}
+    )
@@ -1,10 +1,20 @@
+import functools
+import hashlib
+import html
+import itertools
+import logging
 import multiprocessing as mp
 import re
+import sys
+import time
+import zlib
+from html.entities import html5
+from html.parser import HTMLParser
 
 import justext
 import numpy as np
-from bs4 import BeautifulSoup
-from transformers import AutoTokenizer
+import pyarrow as pa
+import pyarrow.compute as pc
 
 HTML_RE = re.compile(r"<[^>]+>")
 URL_RE = re.compile(
@@ -20,8 +30,18 @@ BULLET_RE = re.compile(r"^(\d)+.\s")
 THREE_DASH_RE = re.compile(r"---.*---")
 MORE_THAN_THREE_POINTS_RE = re.compile(r"\.{4,}")
 
+# Whitespace as defined by HTML, the tags whose text is dropped or kept as is, and
+# the void tags, which are never open.
+HTML_SPACES = "\x20\x0a\x09\x0c\x0d"
+HTML_SKIP_TAGS = {"script", "style", "template", "rt", "rp"}
+HTML_PRESERVE_TAGS = {"pre", "textarea"}
+HTML_VOID_TAGS = set(
+    "area base basefont bgsound br col command embed frame hr image img input "
+    "isindex keygen link menuitem meta nextid param source spacer track wbr".split()
+)
+
 
-TOKENIZER = AutoTokenizer.from_pretrained("meta-llama/Meta-Llama-3-8B")
+TOKENIZER_NAME = "meta-llama/Meta-Llama-3-8B"
 
 VALID_CHARS = "0123456789abcdefghijklmnopqrstuvwxyzàáâãåāèéêëěėēîïíìįīĵłñńôöòóōõšśûüùúūÿýźçćčñń!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~«»“”ºª€ \t\n\r\x0b\x0c"
 
@@ -81,9 +101,35 @@ INVALID_END = [
 ]
 
 
+def _alternation(patterns):
+    # Longest first, so that the reported match is the longest pattern.
+    return "|".join(map(re.escape, sorted(patterns, key=len, reverse=True)))
+
+
+# Anchored patterns are matched with a single regex. The middle patterns are few
+# short literals, for which `str.__contains__` is faster than a regex alternation.
+INVALID_START_RE = re.compile(_alternation(INVALID_START))
+INVALID_END_RE = re.compile(rf"(?:{_alternation(INVALID_END)})\Z")
+MAX_INVALID_END_LEN = max(map(len, INVALID_END))
+
+
 MIN_N_TOKENS = 10
 MAX_N_TOKENS = 900
 
+# Thresholds of justext's context-free classification (justext.core defaults).
+JUSTEXT_LANGUAGE = "Portuguese"
+JUSTEXT_LENGTH_HIGH = 200
+JUSTEXT_STOPWORDS_HIGH = 0.32
+WHITESPACE_RE = re.compile(r"\s+")
+
+DEDUP_BATCH_SIZE = 10_000
+STREAM_BATCH_SIZE = 1_000
+# Candidate pairs whose signatures are compared at once by get_near_unique_idxs.
+NEAR_DEDUP_BATCH_SIZE = 100_000
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
 MONTHS = [
     "january",
     "february",
@@ -100,8 +146,20 @@ MONTHS = [
 ]
 
 
+@functools.cache
+def get_tokenizer():
+    """Load the tokenizer on first use.
+
+    Call it before `dataset.filter`/`dataset.map` with `num_proc > 1` so that the
+    forked workers inherit the loaded tokenizer instead of each loading it.
+    """
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(TOKENIZER_NAME)
+
+
 def _n_tokens(text):
-    return len(TOKENIZER.encode(text))
+    return len(get_tokenizer().encode(text))
 
 
 def bad_translation(pt: str, en: str):
@@ -114,6 +172,15 @@ def valid_n_tokens(text, min_n_tokens=MIN_N_TOKENS, max_n_tokens=MAX_N_TOKENS):
     return min_n_tokens <= _n_tokens(text) <= max_n_tokens
 
 
+def valid_n_tokens_counts(
+    n_tokens_pt, n_tokens_en, min_n_tokens=MIN_N_TOKENS, max_n_tokens=MAX_N_TOKENS
+):
+    """Same as `valid_n_tokens(f"{pt} {en}")`, from the counts added by
+    `add_n_tokens`. The counts exclude special tokens, so the total can be off by
+    one or two tokens from the count of the concatenated text."""
+    return min_n_tokens <= n_tokens_pt + n_tokens_en <= max_n_tokens
+
+
 def has_hashtag(text):
     return len(HASHTAG_RE.findall(text)) > 0
 
@@ -134,16 +201,55 @@ def has_too_long_word(text):
     return any(word for word in text.split(" ") if len(word) > 20)
 
 
+def _match_invalid_start(text):
+    found = INVALID_START_RE.match(text)
+    return found.group() if found else None
+
+
+def _match_invalid_middle(text):
+    for pattern in INVALID_MIDDLE:
+        if pattern in text:
+            return pattern
+    return None
+
+
+def _match_invalid_end(text):
+    # Only the tail of the text can match, no need to scan the rest.
+    found = INVALID_END_RE.search(text, max(0, len(text) - MAX_INVALID_END_LEN))
+    return found.group() if found else None
+
+
+INVALID_PATTERN_MATCHERS = {
+    "invalid_start": _match_invalid_start,
+    "invalid_middle": _match_invalid_middle,
+    "invalid_end": _match_invalid_end,
+}
+
+
+def match_invalid_pattern(text, rules=tuple(INVALID_PATTERN_MATCHERS)):
+    """Find the first of the INVALID_START, INVALID_MIDDLE and INVALID_END patterns
+    in the text, checking only the given `rules`.
+
+    Returns a `(rule, pattern)` tuple such as `("invalid_start", "Sort by")`, or
+    `None` if no pattern matches.
+    """
+    for rule in rules:
+        pattern = INVALID_PATTERN_MATCHERS[rule](text)
+        if pattern is not None:
+            return rule, pattern
+    return None
+
+
 def has_invalid_start(text):
-    return text.startswith(tuple(INVALID_START))
+    return _match_invalid_start(text) is not None
 
 
 def has_invalid_middle(text):
-    return any(True for word in INVALID_MIDDLE if word in text)
+    return _match_invalid_middle(text) is not None
 
 
 def has_invalid_end(text):
-    return text.endswith(tuple(INVALID_END))
+    return _match_invalid_end(text) is not None
 
 
 def has_html_tags(text):
@@ -170,37 +276,333 @@ def is_empty(text):
     return len(text) == 0
 
 
+@functools.cache
+def _valid_char_ranges():
+    """Code point ranges of the characters whose lowercase is in VALID_CHARS.
+
+    Matching the characters of the text against these ranges is equivalent to
+    lowercasing every character and looking it up in VALID_CHARS.
+    """
+    ranges = []
+    for code in range(sys.maxunicode + 1):
+        if chr(code).lower() in VALID_CHARS:
+            if ranges and ranges[-1][1] == code - 1:
+                ranges[-1][1] = code
+            else:
+                ranges.append([code, code])
+    return ranges
+
+
+@functools.cache
+def _invalid_character_re():
+    ranges = "".join(
+        f"\\U{start:08x}-\\U{end:08x}" for start, end in _valid_char_ranges()
+    )
+    return re.compile(f"[^{ranges}]")
+
+
+@functools.cache
+def _invalid_character_re2():
+    """Same as `_invalid_character_re` in RE2 syntax, for `pyarrow.compute`."""
+    ranges = "".join(
+        f"\\x{{{start:x}}}-\\x{{{end:x}}}" for start, end in _valid_char_ranges()
+    )
+    return f"[^{ranges}]"
+
+
 def has_invalid_character(text):
-    for char in text:
-        if char.lower() not in VALID_CHARS:
-            return True
-    return False
+    return _invalid_character_re().search(text) is not None
 
 
-def huggingface_dataset_filter(dataset):
-    return dataset.filter(
-        lambda x: valid_n_tokens(f"{x['pt']} {x['en']}")
-        and not bad_translation(x["pt"], x["en"])
-        and not starts_with_month(x["en"])
-        and not has_too_long_word(x["en"])
-        and not has_too_long_word(x["pt"])
-        and not has_invalid_start(x["en"])
-        and not has_invalid_middle(x["en"])
-        and not has_invalid_end(x["en"])
-        and not has_invalid_end(x["pt"])
-        and not has_more_than_three_points(x["en"])
-        and not has_more_than_three_points(x["pt"])
-        and not is_empty(x["pt"])
-        and not has_invalid_character(x["pt"])
-        and has_valid_brackets(x["pt"])
-        and has_valid_quotes(x["pt"]),
-        num_proc=mp.cpu_count(),
+def find_invalid_characters(text):
+    """The distinct characters of the text that are not valid, for diagnostics."""
+    return sorted(set(_invalid_character_re().findall(text)))
+
+
+def has_invalid_character_batch(texts):
+    """`has_invalid_character` over a batch of texts.
+
+    Arrow string arrays are checked natively by `pyarrow.compute`, which returns
+    a boolean Arrow array. Lists of strings return a list of booleans.
+    """
+    if isinstance(texts, (pa.Array, pa.ChunkedArray)):
+        return pc.match_substring_regex(texts, _invalid_character_re2())
+    invalid_character_re = _invalid_character_re()
+    return [invalid_character_re.search(text) is not None for text in texts]
+
+
+def drop_invalid_characters(dataset, column="pt"):
+    """Drop the rows whose `column` has an invalid character, one Arrow batch at a
+    time."""
+    return (
+        dataset.with_format("arrow")
+        .filter(
+            lambda batch: pc.invert(has_invalid_character_batch(batch[column])),
+            batched=True,
+            num_proc=mp.cpu_count(),
+        )
+        .with_format(None)
+    )
+
+
+def add_n_tokens(dataset):
+    """Add the `n_tokens_pt` and `n_tokens_en` columns with a batched tokenization.
+
+    The columns are only computed if they are missing, so the filters that need
+    the token counts can call this without paying for the tokenization twice.
+    """
+    if {"n_tokens_pt", "n_tokens_en"} <= set(dataset.column_names):
+        return dataset
+
+    tokenizer = get_tokenizer()
+
+    def _count(batch):
+        return {
+            f"n_tokens_{column}": [
+                len(ids)
+                for ids in tokenizer(batch[column], add_special_tokens=False)[
+                    "input_ids"
+                ]
+            ]
+            for column in ["pt", "en"]
+        }
+
+    return dataset.map(_count, batched=True, num_proc=mp.cpu_count())
+
+
+# Row filters grouped in stages, in the order they are reported. Each predicate
+# returns True when the row must be rejected.
+REJECTION_FILTERS = {
+    "max_tokens": {
+        "n_tokens": lambda x: (
+            not valid_n_tokens_counts(x["n_tokens_pt"], x["n_tokens_en"])
+        ),
+    },
+    "invalid_chars": {
+        "invalid_character_pt": lambda x: has_invalid_character(x["pt"]),
+    },
+    "patterns": {
+        "starts_with_month_en": lambda x: starts_with_month(x["en"]),
+        "invalid_pattern_en": lambda x: match_invalid_pattern(x["en"]) is not None,
+        "invalid_end_pt": lambda x: has_invalid_end(x["pt"]),
+        "more_than_three_points_en": lambda x: has_more_than_three_points(x["en"]),
+        "more_than_three_points_pt": lambda x: has_more_than_three_points(x["pt"]),
+    },
+    "misc": {
+        "bad_translation": lambda x: bad_translation(x["pt"], x["en"]),
+        "too_long_word_en": lambda x: has_too_long_word(x["en"]),
+        "too_long_word_pt": lambda x: has_too_long_word(x["pt"]),
+        "empty_pt": lambda x: is_empty(x["pt"]),
+        "invalid_brackets_pt": lambda x: not has_valid_brackets(x["pt"]),
+        "invalid_quotes_pt": lambda x: not has_valid_quotes(x["pt"]),
+    },
+}
+
+
+def rejection_reason(row):
+    """First filter of REJECTION_FILTERS that rejects the row, as `"stage/filter"`,
+    or `None` if the row passes all of them.
+
+    The row needs the `n_tokens_pt` and `n_tokens_en` columns (see `add_n_tokens`).
+    """
+    for stage, filters in REJECTION_FILTERS.items():
+        for name, rejects in filters.items():
+            if rejects(row):
+                return f"{stage}/{name}"
+    return None
+
+
+def rejection_filter_names():
+    return [
+        f"{stage}/{name}"
+        for stage, filters in REJECTION_FILTERS.items()
+        for name in filters
+    ]
+
+
+def timed_rejection_reason(row, seconds):
+    """`rejection_reason` that also adds the time spent in each filter to
+    `seconds`, a list ordered as `rejection_filter_names()`."""
+    idx = 0
+    for stage, filters in REJECTION_FILTERS.items():
+        for name, rejects in filters.items():
+            start = time.perf_counter()
+            rejected = rejects(row)
+            seconds[idx] += time.perf_counter() - start
+            if rejected:
+                return f"{stage}/{name}"
+            idx += 1
+    return None
+
+
+def tag_rejection_reasons(dataset, timed=False):
+    """Add the `rejection_reason` column, computed for every row in a single pass.
+
+    With `timed`, the time spent in each filter is also measured, and stored per
+    batch in the `rejection_seconds` column: a list ordered as
+    `rejection_filter_names()` on the first row of each batch, null on the others.
+    """
+    from datasets import Sequence, Value
+
+    dataset = add_n_tokens(dataset)
+    # Build the regex in this process so that the forked workers inherit it.
+    _invalid_character_re()
+    n_filters = len(rejection_filter_names())
+
+    def _tag(batch):
+        rows = (dict(zip(batch, values)) for values in zip(*batch.values()))
+        if not timed:
+            return {"rejection_reason": [rejection_reason(row) for row in rows]}
+        seconds = [0.0] * n_filters
+        reasons = [timed_rejection_reason(row, seconds) for row in rows]
+        return {
+            "rejection_reason": reasons,
+            "rejection_seconds": [seconds] + [None] * (len(reasons) - 1),
+        }
+
+    features = dataset.features.copy()
+    features["rejection_reason"] = Value("string")
+    if timed:
+        features["rejection_seconds"] = Sequence(Value("float64"))
+    return dataset.map(_tag, batched=True, features=features, num_proc=mp.cpu_count())
+
+
+def rejection_stats(dataset):
+    """Number of rejections and time spent in each filter, from the columns added by
+    `tag_rejection_reasons(dataset, timed=True)`."""
+    names = rejection_filter_names()
+    table = dataset.with_format("arrow")
+    reasons = pc.value_counts(table["rejection_reason"].drop_null())
+    rejections = {count["values"].as_py(): count["counts"].as_py() for count in reasons}
+    batch_seconds = pc.list_flatten(table["rejection_seconds"].drop_null()).to_numpy()
+    seconds = batch_seconds.reshape(-1, len(names)).sum(axis=0)
+    return {
+        name: {"seconds": float(seconds[idx]), "rejections": rejections.get(name, 0)}
+        for idx, name in enumerate(names)
+    }
+
+
+def huggingface_dataset_filter(dataset, profiler=None):
+    """Drop the rows rejected by REJECTION_FILTERS.
+
+    With a `profiler` (see `src.profiling`), the number of rows rejected by each
+    filter and the time spent in it are recorded.
+    """
+    dataset = add_n_tokens(dataset)
+    # Build the regex in this process so that the forked workers inherit it.
+    _invalid_character_re()
+    if profiler is None:
+        return dataset.filter(
+            lambda x: rejection_reason(x) is None,
+            num_proc=mp.cpu_count(),
+        )
+
+    dataset = tag_rejection_reasons(dataset, timed=True)
+    profiler.add_predicates(rejection_stats(dataset))
+    dataset = (
+        dataset.with_format("arrow")
+        .filter(
+            lambda batch: pc.is_null(batch["rejection_reason"]),
+            batched=True,
+        )
+        .with_format(None)
     )
+    return dataset.remove_columns(["rejection_reason", "rejection_seconds"])
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """Collect the text of a document as BeautifulSoup's `get_text()` does with
+    the "html.parser" builder, without building the tree.
+
+    Script, style, template and ruby annotation contents, comments and
+    declarations are dropped, unknown entities are kept as literal text, and
+    strings made only of whitespace are collapsed to a single newline or space.
+    As in BeautifulSoup, an end tag closes every element opened after its own,
+    and an end tag without an open element is ignored.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.parts = []
+        self._data = []
+        self._open = []
+        self._closed_void = []
+        self._skip = 0
+        self._preserve = 0
+
+    def _flush(self):
+        if not self._data:
+            return
+        data = "".join(self._data)
+        self._data = []
+        if not self._preserve and not data.strip(HTML_SPACES):
+            data = "\n" if "\n" in data else " "
+        if not self._skip:
+            self.parts.append(data)
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in HTML_VOID_TAGS:
+            self._closed_void.append(tag)
+            return
+        self._open.append(tag)
+        self._skip += tag in HTML_SKIP_TAGS
+        self._preserve += tag in HTML_PRESERVE_TAGS
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+
+    def handle_endtag(self, tag):
+        # The end tag of a void element is redundant, it doesn't even end the text.
+        if tag in self._closed_void:
+            self._closed_void.remove(tag)
+            return
+        self._flush()
+        if tag not in self._open:
+            return
+        while True:
+            closed = self._open.pop()
+            self._skip -= closed in HTML_SKIP_TAGS
+            self._preserve -= closed in HTML_PRESERVE_TAGS
+            if closed == tag:
+                break
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_charref(self, name):
+        self._data.append(html.unescape(f"&#{name};"))
+
+    def handle_entityref(self, name):
+        self._data.append(html5.get(f"{name};", f"&{name}"))
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.startswith("CDATA["):
+            self.parts.append(data[len("CDATA[") :])
+
+    def close(self):
+        super().close()
+        self._flush()
 
 
 def remove_html_tags(text):
-    soup = BeautifulSoup(text, "html.parser")
-    return soup.get_text()
+    # Most texts have no markup nor entities and are returned as they are.
+    if "<" not in text and "&" not in text and text.strip(HTML_SPACES):
+        return text
+    parser = _HTMLTextExtractor()
+    parser.feed(text)
+    parser.close()
+    return "".join(parser.parts)
 
 
 def remove_hashtags(text):
@@ -241,66 +643,430 @@ def remove_quote_space_end(text):
     return text
 
 
-def huggingface_dataset_transform(dataset):
-    def _transform(text):
+def transform_text(text):
+    """Apply the remove_* functions, in this order: retweets, mentions, hashtags,
+    URLs, HTML tags, COD, bullets, three dashes and the quote spaces.
+
+    Same output as calling them in sequence, but each substitution only runs when
+    a substring check shows it can match, and the text is stripped once at the
+    start and after each substitution that ran, instead of after every step.
+    The substitutions can't be fused in a single regex: removing a mention, for
+    instance, can make a URL match where there was none.
+    """
+    text = text.strip()
+    if "RT @" in text:
         text = remove_retweets(text)
+    if "@" in text:
         text = remove_mentions(text)
+    if "#" in text:
         text = remove_hashtags(text)
+    if "." in text:
         text = remove_urls(text)
-        text = remove_html_tags(text)
+    if "<" in text or "&" in text:
+        # remove_cod_literature strips the output of remove_html_tags.
+        text = remove_cod_literature(remove_html_tags(text))
+    elif "COD _ " in text:
         text = remove_cod_literature(text)
+    if text[:1].isdigit():
         text = remove_bullets(text)
+    if "---" in text:
         text = remove_three_dashes(text)
+    if text.startswith('"'):
         text = remove_quote_space_start(text)
-        text = remove_quote_space_end(text)
-        return text
+    return remove_quote_space_end(text)
+
 
+def huggingface_dataset_transform(dataset):
     return dataset.map(
-        lambda x: {
-            "pt": _transform(x["pt"]),
-            "en": _transform(x["en"]),
+        lambda pt, en: {
+            "pt": [transform_text(text) for text in pt],
+            "en": [transform_text(text) for text in en],
         },
+        input_columns=["pt", "en"],
+        batched=True,
         num_proc=mp.cpu_count(),
     )
 
 
+def hash_bytes(content):
+    """64-bit hash, stable across processes and runs."""
+    digest = hashlib.blake2b(content, digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def hash_text(text):
+    return hash_bytes(text.encode())
+
+
+def _hash_column(dataset, keys, column="pt", batch_size=DEDUP_BATCH_SIZE):
+    """Hash `key(text)` for every key and every text of the column, in a single
+    pass that reads one batch at a time.
+
+    Only the hashes are kept in memory: 8 bytes per row and key, whatever the
+    text size.
+    """
+    hashes = [np.empty(len(dataset), dtype=np.uint64) for _ in keys]
+    offset = 0
+    for batch in dataset.select_columns([column]).iter(batch_size=batch_size):
+        texts = batch[column]
+        for key, key_hashes in zip(keys, hashes):
+            key_hashes[offset : offset + len(texts)] = [
+                hash_text(key(text)) for text in texts
+            ]
+        offset += len(texts)
+    return hashes
+
+
+def _first_occurrences(hashes):
+    """Boolean mask of the first occurrence of each hash."""
+    _, first_idxs = np.unique(hashes, return_index=True)
+    mask = np.zeros(len(hashes), dtype=bool)
+    mask[first_idxs] = True
+    return mask
+
+
+def get_unique_idxs(dataset, column="pt"):
+    """Indices of the first occurrence of each distinct text of the column."""
+    (hashes,) = _hash_column(dataset, [lambda text: text], column)
+    return np.flatnonzero(_first_occurrences(hashes))
+
+
+def get_unique_start_ends_idxs(dataset, n_chars=60, column="pt"):
+    """Indices of the rows that are the first occurrence of both their first and
+    their last `n_chars` characters."""
+    starts, ends = _hash_column(
+        dataset, [lambda text: text[:n_chars], lambda text: text[-n_chars:]], column
+    )
+    return np.flatnonzero(_first_occurrences(starts) & _first_occurrences(ends))
+
+
 def drop_duplicates(dataset):
-    """Drop all the rows that have the same start and end n_chars."""
-    _, unique_idxs_train = np.unique(dataset["pt"], return_index=True, axis=0)
-    unique_idxs_train.sort()
-    dataset = dataset.select(list(unique_idxs_train))
-    return dataset
+    """Drop all the rows whose text was already seen."""
+    return dataset.select(get_unique_idxs(dataset))
 
 
 def drop_duplicates_start_ends(dataset, n_chars: int = 60):
     """Drop all the rows that have the same start and end n_chars."""
-
-    def get_unique_idxs(dataset):
-        _, unique_starts_idxs = np.unique(dataset["start"], return_index=True, axis=0)
-        _, unique_ends_idxs = np.unique(dataset["end"], return_index=True, axis=0)
-        unique_idxs = set.intersection(set(unique_starts_idxs), set(unique_ends_idxs))
-        return unique_idxs
-
-    temp = dataset.map(
-        lambda x: {"start": x["pt"][:n_chars], "end": x["pt"][-n_chars:]},
+    return dataset.select(get_unique_start_ends_idxs(dataset, n_chars))
+
+
+def lsh_params(threshold, num_perm):
+    """Number of bands and rows per band that minimize the probability of false
+    positives plus false negatives around the Jaccard `threshold`."""
+    similarities = np.linspace(0, 1, 1001)
+    below = similarities < threshold
+    best, best_error = None, float("inf")
+    for n_bands in range(1, num_perm + 1):
+        for n_rows in range(1, num_perm // n_bands + 1):
+            p_candidate = 1 - (1 - similarities**n_rows) ** n_bands
+            false_positives = p_candidate[below].mean() * threshold
+            false_negatives = (1 - p_candidate[~below]).mean() * (1 - threshold)
+            if false_positives + false_negatives < best_error:
+                best, best_error = (n_bands, n_rows), false_positives + false_negatives
+    return best
+
+
+def minhash_permutations(num_perm, seed=42):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash_signature(text, permutations, shingle_size=5):
+    """MinHash signature of the set of character shingles of the text."""
+    n_shingles = max(1, len(text) - shingle_size + 1)
+    shingles = {text[i : i + shingle_size] for i in range(n_shingles)}
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode()) for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    a, b = permutations
+    # Universal hashing (a * x + b) mod p; the product wraps around in uint64.
+    permuted = (hashes[:, None] * a[None, :] + b[None, :]) % MERSENNE_PRIME
+    return (permuted & MAX_HASH).min(axis=0).astype(np.uint32)
+
+
+def band_hashes(signature, n_bands, n_rows):
+    hashes = [
+        hash_bytes(signature[band * n_rows : (band + 1) * n_rows].tobytes())
+        for band in range(n_bands)
+    ]
+    return np.array(hashes, dtype=np.uint64)
+
+
+def _list_column_to_numpy(dataset, column, width):
+    """Read a column of fixed-size lists as a 2D array, without Python objects."""
+    values = pc.list_flatten(dataset.with_format("arrow")[column])
+    return values.to_numpy().reshape(len(dataset), width)
+
+
+def get_near_unique_idxs(
+    dataset, threshold=0.8, num_perm=128, shingle_size=5, column="pt", seed=42
+):
+    """Indices of the rows that are not near-duplicates of an earlier row.
+
+    Every text gets a MinHash signature of its character shingles, computed in
+    parallel. The signatures are split in bands and, for every band, each row is
+    compared with the first row that falls in the same bucket. A row is a
+    near-duplicate if the Jaccard similarity estimated from the signatures of
+    one of those candidate pairs is at least `threshold`.
+
+    Comparing with the first row of the bucket only, instead of with every row
+    in it, keeps the number of pairs linear in the number of rows. The price is
+    recall: two near-duplicates that only share a bucket whose first row is
+    dissimilar to both are never compared, so one of them may be kept.
+    """
+    n_bands, n_rows = lsh_params(threshold, num_perm)
+    permutations = minhash_permutations(num_perm, seed)
+
+    def _signatures(batch):
+        signatures = [
+            minhash_signature(text, permutations, shingle_size)
+            for text in batch[column]
+        ]
+        return {
+            "minhash": signatures,
+            "lsh_bands": [band_hashes(sig, n_bands, n_rows) for sig in signatures],
+        }
+
+    signatures = dataset.select_columns([column]).map(
+        _signatures,
+        batched=True,
+        remove_columns=[column],
         num_proc=mp.cpu_count(),
     )
-
-    unique_idxs_train = get_unique_idxs(temp)
-    dataset = dataset.select(list(unique_idxs_train))
-    return dataset
+    buckets = _list_column_to_numpy(signatures, "lsh_bands", n_bands)
+
+    # Candidate pairs (row, first row of its bucket) of every band, encoded as
+    # row * n + first so the pairs repeated across bands are dropped by a 1D
+    # np.unique.
+    n = len(dataset)
+    idxs = np.arange(n, dtype=np.int64)
+    pairs = []
+    for band in range(n_bands):
+        _, first_idxs, inverse = np.unique(
+            buckets[:, band], return_index=True, return_inverse=True
+        )
+        firsts = first_idxs[inverse.reshape(-1)]
+        is_candidate = firsts != idxs
+        pairs.append(idxs[is_candidate] * n + firsts[is_candidate])
+    pairs = np.unique(np.concatenate(pairs))
+    rows, firsts = pairs // n, pairs % n
+
+    duplicated = np.zeros(n, dtype=bool)
+    if len(pairs):
+        involved = np.unique(np.concatenate([rows, firsts]))
+        minhashes = _list_column_to_numpy(
+            signatures.select(involved), "minhash", num_perm
+        )
+        rows_pos = np.searchsorted(involved, rows)
+        firsts_pos = np.searchsorted(involved, firsts)
+        for start in range(0, len(pairs), NEAR_DEDUP_BATCH_SIZE):
+            batch = slice(start, start + NEAR_DEDUP_BATCH_SIZE)
+            similarities = np.mean(
+                minhashes[rows_pos[batch]] == minhashes[firsts_pos[batch]], axis=1
+            )
+            duplicated[rows[batch][similarities >= threshold]] = True
+    return np.flatnonzero(~duplicated)
+
+
+def drop_near_duplicates(dataset, threshold=0.8, num_perm=128, shingle_size=5):
+    """Drop the rows whose text is a near-duplicate (MinHash-LSH) of an earlier row."""
+    idxs = get_near_unique_idxs(dataset, threshold, num_perm, shingle_size)
+    return dataset.select(idxs)
+
+
+@functools.cache
+def get_justext_stoplist():
+    return justext.get_stoplist(JUSTEXT_LANGUAGE)
 
 
 def is_justext_good_class(text):
-    paragraph = justext.justext(text, justext.get_stoplist("Portuguese"))
+    paragraph = justext.justext(text, get_justext_stoplist())
     if len(paragraph) == 0:
         return False
     return paragraph[0].class_type == "good"
 
 
-def drop_justext_bad_class(dataset):
-    """Drop all the entries that are demed bad by justext"""
+def justext_features(text, stoplist):
+    """Length and stopword density of the paragraph justext makes of a plain text,
+    as `Paragraph.__len__` and `Paragraph.stopwords_density` compute them."""
+    words = text.split()
+    length = len(WHITESPACE_RE.sub(" ", text.strip()))
+    if not words:
+        return length, 0
+    n_stopwords = sum(word.lower() in stoplist for word in words)
+    return length, n_stopwords / len(words)
+
+
+def is_good_quality_batch(texts):
+    """`is_justext_good_class` for a batch of texts.
+
+    A text without markup nor entities is a single paragraph for justext, with
+    no links and no heading. Its final class only depends on the context-free
+    one, which is "good" when the paragraph is long enough, dense enough in
+    stopwords and has no copyright sign; any other class is revised to "bad"
+    for lack of good neighbours. Those features are computed here on the text
+    directly. The other texts go through justext.
+    """
+    stoplist = get_justext_stoplist()
+    good = []
+    for text in texts:
+        if "<" in text or "&" in text:
+            good.append(bool(text.strip()) and is_justext_good_class(text))
+            continue
+        length, stopword_density = justext_features(text, stoplist)
+        good.append(
+            "\xa9" not in text
+            and length > JUSTEXT_LENGTH_HIGH
+            and stopword_density >= JUSTEXT_STOPWORDS_HIGH
+        )
+    return good
+
+
+def justext_agreement(texts):
+    """Fraction of the texts for which `is_good_quality_batch` and
+    `is_justext_good_class` agree."""
+    texts = [text for text in texts if text.strip()]
+    good = is_good_quality_batch(texts)
+    agree = sum(g == is_justext_good_class(text) for g, text in zip(good, texts))
+    return agree / len(texts) if texts else 1.0
+
+
+def drop_justext_bad_class(dataset, validation_size=1_000):
+    """Drop all the entries that are demed bad by justext.
+
+    The agreement of `is_good_quality_batch` with justext is logged for a random
+    sample of `validation_size` rows.
+    """
+    if validation_size:
+        rng = np.random.default_rng(42)
+        size = min(validation_size, len(dataset))
+        idxs = rng.choice(len(dataset), size=size, replace=False)
+        rate = justext_agreement(dataset.select(idxs)["pt"])
+        logging.info(f"Agreement with justext on {size} rows: {rate:.2%}")
+
+    # Load the stoplist in this process so that the forked workers inherit it.
+    get_justext_stoplist()
     return dataset.filter(
-        lambda x: is_justext_good_class(x["pt"]),
+        is_good_quality_batch,
+        input_columns=["pt"],
+        batched=True,
         num_proc=mp.cpu_count(),
     )
+
+
+# Streaming versions of the stages above. They take and yield rows as dicts, so
+# they work on plain generators as well as on a `datasets.IterableDataset`, and
+# go over the data in a single sequential pass.
+
+
+class HashSet:
+    """Set of 64-bit hashes in an open-addressing table of 8 bytes per slot.
+
+    A Python set of ints takes ~100 bytes per entry; this one takes at most 32,
+    since the table is doubled when it gets half full.
+    """
+
+    def __init__(self, capacity=1 << 16):
+        self._table = np.zeros(capacity, dtype=np.uint64)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, value):
+        """Add the hash to the set. Returns False if it was already there."""
+        # 0 marks the empty slots.
+        value = value or 1
+        if 2 * (self._size + 1) > len(self._table):
+            self._resize(2 * len(self._table))
+        table = self._table
+        mask = len(table) - 1
+        idx = value & mask
+        while (slot := table[idx]) != 0:
+            if slot == value:
+                return False
+            idx = (idx + 1) & mask
+        table[idx] = value
+        self._size += 1
+        return True
+
+    def _resize(self, capacity):
+        values = self._table[self._table != 0]
+        self._table = np.zeros(capacity, dtype=np.uint64)
+        self._size = 0
+        for value in values.tolist():
+            self.add(value)
+
+
+def _batched(rows, batch_size):
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, batch_size)):
+        yield batch
+
+
+def stream_drop_duplicates(rows, column="pt"):
+    """Streaming `drop_duplicates`: yield the rows whose text was not seen before."""
+    seen = HashSet()
+    for row in rows:
+        if seen.add(hash_text(row[column])):
+            yield row
+
+
+def stream_drop_duplicates_start_ends(rows, n_chars=60, column="pt"):
+    """Streaming `drop_duplicates_start_ends`: yield the rows whose first and last
+    `n_chars` characters were both not seen before."""
+    starts, ends = HashSet(), HashSet()
+    for row in rows:
+        text = row[column]
+        # Both hashes are recorded even if the row is dropped, as in the batch version.
+        new_start = starts.add(hash_text(text[:n_chars]))
+        new_end = ends.add(hash_text(text[-n_chars:]))
+        if new_start and new_end:
+            yield row
+
+
+def stream_transform(rows):
+    """Streaming `huggingface_dataset_transform`."""
+    for row in rows:
+        yield {**row, "pt": transform_text(row["pt"]), "en": transform_text(row["en"])}
+
+
+def stream_filter(rows, batch_size=STREAM_BATCH_SIZE):
+    """Streaming `add_n_tokens` + `huggingface_dataset_filter`. The rows are
+    tokenized `batch_size` at a time."""
+    tokenizer = get_tokenizer()
+    for batch in _batched(rows, batch_size):
+        n_tokens = {
+            column: [
+                len(ids)
+                for ids in tokenizer(
+                    [row[column] for row in batch], add_special_tokens=False
+                )["input_ids"]
+            ]
+            for column in ["pt", "en"]
+        }
+        for row, n_tokens_pt, n_tokens_en in zip(batch, n_tokens["pt"], n_tokens["en"]):
+            row = {**row, "n_tokens_pt": n_tokens_pt, "n_tokens_en": n_tokens_en}
+            if rejection_reason(row) is None:
+                yield row
+
+
+def stream_drop_justext_bad_class(rows, batch_size=STREAM_BATCH_SIZE):
+    """Streaming `drop_justext_bad_class`."""
+    for batch in _batched(rows, batch_size):
+        good = is_good_quality_batch([row["pt"] for row in batch])
+        yield from (row for row, keep in zip(batch, good) if keep)
+
+
+def stream_clean(rows):
+    """The `clean` pipeline as a generator: exact and start/end deduplication,
+    transforms and filters. Only the hashes of the deduplication stages are kept
+    in memory."""
+    rows = stream_drop_duplicates(rows)
+    rows = stream_drop_duplicates_start_ends(rows)
+    rows = stream_transform(rows)
+    yield from stream_filter(rows)
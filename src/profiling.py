@@ -0,0 +1,114 @@
+import contextlib
+import csv
+import json
+import logging
+import resource
+import sys
+import time
+
+from src.constants import DATA_PATH
+
+REPORTS_PATH = DATA_PATH / "reports"
+
+RU_MAXRSS_PER_MB = 1024**2 if sys.platform == "darwin" else 1024
+
+COLUMNS = [
+    "kind",
+    "name",
+    "seconds",
+    "rows_in",
+    "rows_out",
+    "rows_per_second",
+    "process_peak_rss_mb",
+    "peak_rss_increase_mb",
+    "rejections",
+]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its finished children (the
+    `num_proc` workers of `datasets`) over their lifetime, in MB."""
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak / RU_MAXRSS_PER_MB
+
+
+class Profiler:
+    """Record the wall time, rows in and out and peak memory of each stage, and
+    the cost and number of rejections of each predicate.
+
+    The peak memory is a high-water mark: `process_peak_rss_mb` is the peak of the
+    whole run so far, so every stage after the most memory-hungry one reports the
+    same value, and `peak_rss_increase_mb` is how much the stage raised it (0 for
+    a stage that stayed below the previous peak).
+
+    It only measures stage boundaries and per-batch predicate timings, so it can
+    be left on for full runs.
+    """
+
+    def __init__(self):
+        self.stages = []
+        self.predicates = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=None):
+        """Time the body of the `with`. Set `rows_out` on the yielded record."""
+        record = {"kind": "stage", "name": name, "rows_in": rows_in, "rows_out": None}
+        peak_before = peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            record["process_peak_rss_mb"] = peak_rss_mb()
+            record["peak_rss_increase_mb"] = record["process_peak_rss_mb"] - peak_before
+            # Streaming stages don't know their input size.
+            rows = record["rows_in"]
+            if rows is None:
+                rows = record["rows_out"]
+            if rows is not None and record["seconds"] > 0:
+                record["rows_per_second"] = rows / record["seconds"]
+            self.stages.append(record)
+            logging.info(
+                f"Stage {name}: {record['seconds']:.1f}s, "
+                f"{record['rows_in']} -> {record['rows_out']} rows."
+            )
+
+    def run_stage(self, name, function, dataset):
+        """Run `function(dataset)` as a stage and return its output."""
+        with self.stage(name, len(dataset)) as record:
+            output = function(dataset)
+            record["rows_out"] = len(output)
+        return output
+
+    def add_predicates(self, stats):
+        """Add `{name: {"seconds": ..., "rejections": ...}}` to the totals."""
+        for name, stat in stats.items():
+            total = self.predicates.setdefault(name, {"seconds": 0.0, "rejections": 0})
+            total["seconds"] += stat["seconds"]
+            total["rejections"] += stat["rejections"]
+
+    def records(self):
+        predicates = [
+            {"kind": "predicate", "name": name, **stat}
+            for name, stat in self.predicates.items()
+        ]
+        return [
+            {column: record.get(column) for column in COLUMNS}
+            for record in self.stages + predicates
+        ]
+
+    def save(self, path):
+        """Write the report to `path` with a .json and a .csv suffix."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        records = self.records()
+        with path.with_suffix(".json").open("w") as fout:
+            json.dump(records, fout, indent=4)
+        with path.with_suffix(".csv").open("w", newline="") as fout:
+            writer = csv.DictWriter(fout, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(records)
+        logging.info(f"Profiling report saved to {path.with_suffix('.json')}.")
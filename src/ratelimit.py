@@ -0,0 +1,103 @@
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """Allow on average `rate` requests per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self._rate = rate
+        self._capacity = capacity or max(1.0, rate)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._capacity, self._tokens + (now - self._updated) * self._rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+class AIMDLimiter:
+    """Concurrency limit adjusted by additive increase / multiplicative decrease.
+
+    Every successful request raises the limit by `increase / limit`, i.e. by
+    `increase` per window of `limit` requests, and a failed request scales it by
+    `decrease`. Failures of requests started before the last decrease are
+    ignored, so a burst of failures of the same window only decreases the limit
+    once. A failure that is not a sign of overload (`throttled=False`, e.g. a bad
+    input) leaves the limit as it is. `acquire` blocks while the number of
+    requests in flight is at the limit.
+    """
+
+    def __init__(
+        self,
+        initial: int = 5,
+        minimum: int = 1,
+        maximum: int = 32,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+    ) -> None:
+        self._limit = float(initial)
+        self._minimum = minimum
+        self._maximum = maximum
+        self._increase = increase
+        self._decrease = decrease
+        self._in_flight = 0
+        self._n_decreases = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self) -> int:
+        """Wait for a slot. Returns the window of the request, to pass to
+        `release`."""
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+            return self._n_decreases
+
+    def release(
+        self, success: bool, window: int | None = None, throttled: bool = True
+    ) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            if success:
+                self._limit = min(
+                    self._maximum, self._limit + self._increase / self._limit
+                )
+            elif throttled and (window is None or window == self._n_decreases):
+                self._limit = max(self._minimum, self._limit * self._decrease)
+                self._n_decreases += 1
+            self._condition.notify_all()
+
+
+class Retry:
+    """Exponential backoff with full jitter between failed attempts."""
+
+    def __init__(
+        self, max_retries: int = 5, base: float = 1.0, cap: float = 60.0
+    ) -> None:
+        self.max_retries = max_retries
+        self._base = base
+        self._cap = cap
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self._cap, self._base * 2**attempt))
@@ -0,0 +1,229 @@
+import bisect
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.constants import DATA_PATH
+
+METRICS_PATH = DATA_PATH / "metrics"
+
+# Upper bounds, in seconds, of the buckets of the request latency histogram.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PREFIX = "translation"
+
+
+def escape_label(value):
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Counters of the translation requests, safe to update from many threads.
+
+    Tracks the latency histogram of successful requests, the number of requests
+    and translated characters, the retries and the errors by exception type.
+    Gauges, such as the current concurrency limit, are read from callbacks when
+    a snapshot is taken.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.latency_sum = 0.0
+        self.requests = 0
+        self.chars = 0
+        self.retries = 0
+        self.errors = Counter()
+        self._gauges = {}
+
+    def observe_request(self, seconds, n_chars):
+        """Record a successful request that took `seconds` for `n_chars` characters."""
+        with self._lock:
+            self.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.latency_sum += seconds
+            self.requests += 1
+            self.chars += n_chars
+
+    def observe_error(self, error, retried):
+        """Record a failed request, and whether it is going to be retried."""
+        with self._lock:
+            self.errors[type(error).__name__] += 1
+            self.retries += retried
+
+    def gauge(self, name, read, help=""):
+        """Report `read()` as the gauge `name` in every snapshot."""
+        self._gauges[name] = (read, help)
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._start
+            snapshot = {
+                "timestamp": time.time(),
+                "elapsed_seconds": elapsed,
+                "requests": self.requests,
+                "chars": self.chars,
+                "retries": self.retries,
+                "errors": dict(self.errors),
+                "latency": {
+                    "buckets": list(self.buckets),
+                    "counts": list(self.bucket_counts),
+                    "sum": self.latency_sum,
+                },
+            }
+        snapshot["requests_per_second"] = snapshot["requests"] / elapsed
+        snapshot["chars_per_second"] = snapshot["chars"] / elapsed
+        snapshot["gauges"] = {name: read() for name, (read, _) in self._gauges.items()}
+        return snapshot
+
+    def to_prometheus(self):
+        """The metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help, samples):
+            lines.append(f"# HELP {PREFIX}_{name} {help}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+            for suffix, labels, value in samples:
+                labels = ",".join(
+                    f'{key}="{escape_label(label)}"' for key, label in labels.items()
+                )
+                labels = f"{{{labels}}}" if labels else ""
+                lines.append(f"{PREFIX}_{name}{suffix}{labels} {value}")
+
+        counters = [
+            ("requests_total", "Successful requests.", snapshot["requests"]),
+            ("chars_total", "Characters translated.", snapshot["chars"]),
+            (
+                "retries_total",
+                "Failed requests that were retried.",
+                snapshot["retries"],
+            ),
+        ]
+        for name, help, value in counters:
+            metric(name, "counter", help, [("", {}, value)])
+        metric(
+            "errors_total",
+            "counter",
+            "Failed requests by exception type.",
+            [("", {"type": type}, n) for type, n in snapshot["errors"].items()],
+        )
+
+        latency = snapshot["latency"]
+        cumulative, samples = 0, []
+        bounds = [*map(str, latency["buckets"]), "+Inf"]
+        for bound, count in zip(bounds, latency["counts"]):
+            cumulative += count
+            samples.append(("_bucket", {"le": bound}, cumulative))
+        samples.append(("_sum", {}, latency["sum"]))
+        samples.append(("_count", {}, cumulative))
+        metric(
+            "request_latency_seconds",
+            "histogram",
+            "Latency of successful requests.",
+            samples,
+        )
+
+        for name, value in snapshot["gauges"].items():
+            metric(name, "gauge", self._gauges[name][1], [("", {}, value)])
+        return "\n".join(lines) + "\n"
+
+
+class MetricsWriter:
+    """Write a snapshot of the metrics to a JSON file every `interval` seconds.
+
+    Each snapshot also has the request and character rates over the last
+    interval, which show throttling as it happens. The file is replaced
+    atomically, so it can be read at any time.
+    """
+
+    def __init__(self, metrics, path, interval=10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._previous = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+    def flush(self):
+        snapshot = self.metrics.snapshot()
+        previous = self._previous
+        if previous is not None:
+            window = snapshot["elapsed_seconds"] - previous["elapsed_seconds"]
+            for name in ["requests", "chars"]:
+                delta = snapshot[name] - previous[name]
+                snapshot[f"recent_{name}_per_second"] = (
+                    delta / window if window else 0.0
+                )
+        self._previous = snapshot
+
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        with tmp_path.open("w") as fout:
+            json.dump(snapshot, fout, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            # Keep the thread alive: a failed write is retried at the next interval.
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Could not write the metrics to {self.path}: {e}")
+
+
+def serve(metrics, port, host="127.0.0.1"):
+    """Expose the metrics in the Prometheus text format at
+    `http://<host>:<port>/metrics`, from a background thread. Returns the server;
+    call `shutdown()` on it to stop it."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Serving metrics at http://{host}:{server.server_port}/metrics.")
+    return server
+
+
+@contextlib.contextmanager
+def report(metrics, path, port=None, interval=10.0):
+    """Write the metrics to `path` every `interval` seconds, and serve them on
+    `port` if given, for the duration of the `with` block."""
+    writer = MetricsWriter(metrics, path, interval).start()
+    server = serve(metrics, port) if port is not None else None
+    try:
+        yield metrics
+    finally:
+        writer.stop()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
@@ -1,37 +1,221 @@
-from deep_translator import GoogleTranslator
+import functools
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-_LANGUAGES = GoogleTranslator().get_supported_languages()
+from src import packing
+from src.backends import TransientError, get_backend
+from src.chunking import chunk
+from src.constants import RESOURCES_PATH
+from src.engine import translate_stream
+from src.ratelimit import Retry
 
+MAX_CHARS = 5000
 
-def list_languages():
-    print(_LANGUAGES)
+LANGUAGES_PATH = RESOURCES_PATH / "languages.json"
+
+# Failures that are retried; any other error is raised right away.
+RETRYABLE_ERRORS = (TransientError, TimeoutError)
+
+
+@functools.cache
+def _read_languages() -> dict:
+    return json.load(LANGUAGES_PATH.open())
+
+
+def get_languages(refresh: bool = False) -> dict:
+    """Map of the supported language names to their codes.
+
+    The list is read from the snapshot bundled in `resources/languages.json`.
+    With `refresh=True` it is requested from the translation service instead
+    and the snapshot is updated.
+    """
+    if refresh:
+        from deep_translator import GoogleTranslator
+
+        languages = GoogleTranslator().get_supported_languages(as_dict=True)
+        json.dump(languages, LANGUAGES_PATH.open("w"), indent=4)
+        _read_languages.cache_clear()
+    return _read_languages()
+
+
+def list_languages(refresh: bool = False):
+    print(list(get_languages(refresh)))
 
 
 class Translator:
-    def __init__(self, source, target):
+    def __init__(
+        self,
+        source,
+        target,
+        backend="google",
+        cache=None,
+        rate_limiter=None,
+        concurrency_limiter=None,
+        retry=None,
+        chunk_workers=8,
+        metrics=None,
+    ):
+        """
+        cache: optional `src.cache.TranslationCache` consulted before every
+            request to the backend.
+        rate_limiter: optional `src.ratelimit.TokenBucket` throttling the requests.
+        concurrency_limiter: optional `src.ratelimit.AIMDLimiter` bounding the
+            requests in flight, shrinking it on failures and growing it on successes.
+        retry: `src.ratelimit.Retry` policy for requests that failed with a
+            throttling or transient error (see `RETRYABLE_ERRORS`).
+        chunk_workers: number of chunks of a long text translated concurrently.
+        metrics: optional `src.telemetry.Metrics` recording the latency, size and
+            errors of every request to the backend.
+        """
         self._source = source
         self._target = target
-        self._engine = GoogleTranslator(source=source, target=target)
+        self._engine = get_backend(backend, source=source, target=target)
+        self._cache = cache
+        self._rate_limiter = rate_limiter
+        self._concurrency_limiter = concurrency_limiter
+        self._retry = retry or Retry()
+        self._chunk_workers = chunk_workers
+        self._metrics = metrics
+        if metrics is not None and concurrency_limiter is not None:
+            metrics.gauge(
+                "concurrency_limit",
+                lambda: concurrency_limiter.limit,
+                "Maximum number of requests in flight.",
+            )
+            metrics.gauge(
+                "requests_in_flight",
+                lambda: concurrency_limiter.in_flight,
+                "Requests in flight.",
+            )
 
     def __call__(self, text: str) -> str:
         return self.translate(text)
 
+    def stream(self, items, concurrency=5, pack=False):
+        """Translate `(id, text)` items concurrently, yielding `(id, text, translation)`
+        as each request completes. See `src.engine.translate_stream`.
+
+        With `pack=True` consecutive short texts are sent in a single request.
+        """
+        if pack:
+            return self._stream_packed(items, concurrency)
+        return translate_stream(self.translate, items, concurrency)
+
+    async def _stream_packed(self, items, concurrency):
+        groups = (
+            ([id for id, _ in group], [text for _, text in group])
+            for group in packing.pack(items, MAX_CHARS)
+        )
+        stream = translate_stream(self.translate_batch, groups, concurrency)
+        async for ids, texts, translations in stream:
+            translations = translations or [None] * len(texts)
+            for id, text, translation in zip(ids, texts, translations):
+                yield id, text, translation
+
+    def translate_batch(self, texts):
+        """Translate a list of texts packing them in as few requests as possible.
+
+        If the translation of a pack cannot be split back into its texts, the
+        texts in that pack are translated one by one.
+        """
+        translations = [None] * len(texts)
+        missing = []
+        for idx, text in enumerate(texts):
+            translations[idx] = self._cache_get(text)
+            if translations[idx] is None:
+                missing.append((idx, text))
+
+        for group in packing.pack(missing, MAX_CHARS):
+            idxs = [idx for idx, _ in group]
+            group_texts = [text for _, text in group]
+            if len(group_texts) == 1:
+                parts = [self._translate_text(group_texts[0])]
+            else:
+                translated = self._translate(packing.join(group_texts))
+                parts = (
+                    packing.split(translated, len(group_texts)) if translated else None
+                )
+                if parts is None:
+                    logging.warning(
+                        f"Could not split a pack of {len(group_texts)} texts. "
+                        "Translating them one by one."
+                    )
+                    parts = [self._translate_text(text) for text in group_texts]
+
+            for idx, text, translation in zip(idxs, group_texts, parts):
+                self._cache_put(text, translation)
+                translations[idx] = translation
+        return translations
+
     def translate(self, text):
-        if len(text) <= 5000:
+        translation = self._cache_get(text)
+        if translation is None:
+            translation = self._translate_text(text)
+            self._cache_put(text, translation)
+        return translation
+
+    def _translate_text(self, text):
+        if len(text) <= MAX_CHARS:
             return self._translate(text)
-        else:
-            if "\n" in text:
-                return self._split_translate(text, "\n")
-            else:
-                return self._split_translate(text, ". ")
+        return self._chunk_translate(text)
+
+    def _cache_get(self, text):
+        if self._cache is None:
+            return None
+        return self._cache.get(text, self._source, self._target)
+
+    def _cache_put(self, text, translation):
+        if self._cache is not None and translation:
+            self._cache.put(text, self._source, self._target, translation)
 
     def _translate(self, text):
-        return self._engine.translate(text)
-
-    def _split_translate(self, text, split):
-        parts = []
-        for part in text.split(split):
-            translated = self.translate(part)
-            if translated:
-                parts.append(translated)
-        return split.join(parts)
+        for attempt in range(self._retry.max_retries + 1):
+            if self._rate_limiter is not None:
+                self._rate_limiter.acquire()
+            if self._concurrency_limiter is not None:
+                window = self._concurrency_limiter.acquire()
+
+            start = time.perf_counter()
+            try:
+                translation = self._engine.translate(text)
+            except Exception as e:
+                # Only throttling and timeouts are a sign of overload.
+                transient = isinstance(e, RETRYABLE_ERRORS)
+                if self._concurrency_limiter is not None:
+                    self._concurrency_limiter.release(
+                        success=False, window=window, throttled=transient
+                    )
+                retried = transient and attempt < self._retry.max_retries
+                if self._metrics is not None:
+                    self._metrics.observe_error(e, retried)
+                if not retried:
+                    raise
+                delay = self._retry.delay(attempt)
+                logging.warning(f"Request failed ({e}). Retrying in {delay:.1f}s.")
+                time.sleep(delay)
+            else:
+                if self._concurrency_limiter is not None:
+                    self._concurrency_limiter.release(success=True)
+                if self._metrics is not None:
+                    self._metrics.observe_request(
+                        time.perf_counter() - start, len(text)
+                    )
+                return translation
+
+    def _chunk_translate(self, text):
+        """Translate a long text in chunks close to `MAX_CHARS`, concurrently."""
+        chunks = chunk(text, MAX_CHARS)
+        with ThreadPoolExecutor(max_workers=self._chunk_workers) as executor:
+            translations = executor.map(self._translate_chunk, chunks)
+            return "".join(translations)
+
+    def _translate_chunk(self, text):
+        """Translate the chunk keeping its surrounding whitespace."""
+        content = text.strip()
+        if not content:
+            return text
+        start = len(text) - len(text.lstrip())
+        translated = self._translate(content) or ""
+        return text[:start] + translated + text[start + len(content) :]
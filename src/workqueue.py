@@ -0,0 +1,139 @@
+import contextlib
+import logging
+import os
+import socket
+import sqlite3
+import time
+from pathlib import Path
+
+from src.constants import DATA_PATH
+
+QUEUES_PATH = DATA_PATH / "queues"
+
+# Number of consecutive ids handed out in one lease.
+RANGE_SIZE = 1_000
+
+# Seconds a worker can hold a range without renewing its lease.
+LEASE_SECONDS = 600.0
+
+
+def queue_path(name: str) -> Path:
+    return QUEUES_PATH / f"{name}.sqlite"
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """Ranges of ids handed out to workers with time-limited leases.
+
+    The queue is a SQLite file, so any number of worker processes sharing it can
+    join or leave a job at any time. A worker leases a range, translates it and
+    marks it as done. If the worker dies, its lease expires and the range is
+    handed out again. Workers renew the leases of the ranges they are working on.
+    """
+
+    def __init__(self, path: Path, timeout: float = 60.0) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Transactions are managed explicitly, see `_transaction`.
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ranges ("
+            "start INTEGER PRIMARY KEY, stop INTEGER NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'pending', worker TEXT, expires REAL)"
+        )
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Take the write lock up front, so concurrent workers can't lease the
+        same range."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def populate(self, n_ids: int, range_size: int = RANGE_SIZE) -> None:
+        """Split the ids `0..n_ids` in ranges, unless the queue already has them."""
+        with self._transaction() as conn:
+            (n_total,) = conn.execute("SELECT MAX(stop) FROM ranges").fetchone()
+            if n_total is None:
+                conn.executemany(
+                    "INSERT INTO ranges (start, stop) VALUES (?, ?)",
+                    [
+                        (start, min(start + range_size, n_ids))
+                        for start in range(0, n_ids, range_size)
+                    ],
+                )
+            elif n_total != n_ids:
+                raise ValueError(f"The queue has {n_total} ids, expected {n_ids}")
+
+    def acquire(self, worker: str, lease_seconds: float = LEASE_SECONDS):
+        """Lease the first pending or expired range to `worker`. Returns its
+        `(start, stop)`, or `None` if no range is available."""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT start, stop, worker FROM ranges "
+                "WHERE status = 'pending' OR (status = 'leased' AND expires < ?) "
+                "ORDER BY start LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            start, stop, previous = row
+            conn.execute(
+                "UPDATE ranges SET status = 'leased', worker = ?, expires = ? "
+                "WHERE start = ?",
+                (worker, now + lease_seconds, start),
+            )
+        if previous is not None:
+            logging.info(
+                f"Reclaimed the expired lease of {previous} on ids {start}-{stop}."
+            )
+        return start, stop
+
+    def renew(self, worker: str, lease_seconds: float = LEASE_SECONDS) -> int:
+        """Extend the leases of `worker`. Returns the number of leases it holds."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE ranges SET expires = ? WHERE status = 'leased' AND worker = ?",
+                (time.time() + lease_seconds, worker),
+            )
+        return cursor.rowcount
+
+    def complete(self, start: int) -> None:
+        """Mark the range starting at `start` as done. Its results must already be
+        saved."""
+        with self._transaction() as conn:
+            conn.execute("UPDATE ranges SET status = 'done' WHERE start = ?", (start,))
+
+    def release(self, worker: str) -> None:
+        """Put the ranges leased by `worker` back in the queue, e.g. when it stops."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE ranges SET status = 'pending', worker = NULL, expires = NULL "
+                "WHERE status = 'leased' AND worker = ?",
+                (worker,),
+            )
+
+    def counts(self) -> dict:
+        """Number of ranges that are pending, leased, expired and done."""
+        rows = self._conn.execute(
+            "SELECT CASE WHEN status = 'leased' AND expires < ? THEN 'expired' "
+            "ELSE status END, COUNT(*) FROM ranges GROUP BY 1",
+            (time.time(),),
+        ).fetchall()
+        return {"pending": 0, "leased": 0, "expired": 0, "done": 0, **dict(rows)}
+
+    @property
+    def finished(self) -> bool:
+        counts = self.counts()
+        return counts["done"] == sum(counts.values())
+
+    def close(self) -> None:
+        self._conn.close()
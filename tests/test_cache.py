@@ -0,0 +1,55 @@
+from src.cache import TranslationCache, cache_key
+from src.translator import Translator
+
+
+class CountingBackend:
+    def __init__(self):
+        self.n_requests = 0
+
+    def translate(self, text):
+        self.n_requests += 1
+        return text.upper()
+
+
+def test_cache_key():
+    assert cache_key(" Olá ", "pt", "en") == cache_key("Olá", "pt", "en")
+    assert cache_key("Olá", "pt", "en") == cache_key("Olá", "pt", "en")
+    assert cache_key("Olá", "pt", "en") != cache_key("Olá", "pt", "fr")
+
+
+def test_cache(tmp_path):
+    cache = TranslationCache(tmp_path / "cache.sqlite", capacity=1)
+    assert cache.get("Olá", "pt", "en") is None
+    cache.put("Olá", "pt", "en", "Hello")
+    cache.put("Adeus", "pt", "en", "Goodbye")
+    assert cache.get("Adeus", "pt", "en") == "Goodbye"
+    assert cache.get("Olá", "pt", "en") == "Hello"
+    assert cache.stats == {
+        "memory_hits": 1,
+        "disk_hits": 1,
+        "misses": 1,
+        "hit_rate": 2 / 3,
+    }
+    cache.close()
+
+    cache = TranslationCache(tmp_path / "cache.sqlite")
+    assert len(cache) == 2
+    assert cache.get("Olá", "pt", "en") == "Hello"
+
+
+def test_translator_cache(tmp_path):
+    cache = TranslationCache(tmp_path / "cache.sqlite")
+    translator = Translator(source="pt", target="en", backend="identity", cache=cache)
+    backend = translator._engine = CountingBackend()
+
+    assert translator.translate("olá") == "OLÁ"
+    assert translator.translate("olá ") == "OLÁ"
+    assert backend.n_requests == 1
+
+    assert translator.translate_batch(["olá", "mundo", "adeus"]) == [
+        "OLÁ",
+        "MUNDO",
+        "ADEUS",
+    ]
+    assert backend.n_requests == 2
+    assert cache.get("mundo", "pt", "en") == "MUNDO"
@@ -0,0 +1,55 @@
+import threading
+import time
+from pathlib import Path
+
+from src.chunking import chunk
+from src.translator import MAX_CHARS, Translator
+
+
+class SlowBackend:
+    def __init__(self):
+        self.n_requests = 0
+        self._lock = threading.Lock()
+
+    def translate(self, text):
+        with self._lock:
+            self.n_requests += 1
+        time.sleep(0.1)
+        return text.upper()
+
+
+def test_chunk():
+    text = "Um parágrafo.\nOutro parágrafo. Com duas frases.\nFim."
+    assert chunk(text, 100) == [text]
+    assert chunk(text, 20) == [
+        "Um parágrafo.\n",
+        "Outro parágrafo. ",
+        "Com duas frases.\n",
+        "Fim.",
+    ]
+
+
+def test_chunk_long_word():
+    assert chunk("a" * 25, 10) == ["a" * 10, "a" * 10, "a" * 5]
+
+
+def test_chunk_long_text():
+    text = (Path(__file__).parent / "long_long_text.txt").read_text()
+    chunks = chunk(text, MAX_CHARS)
+    assert "".join(chunks) == text
+    assert all(len(c) <= MAX_CHARS for c in chunks)
+    assert len(chunks) == 2
+
+
+def test_translate_long_text_concurrently():
+    translator = Translator(source="pt", target="en", backend="identity")
+    backend = translator._engine = SlowBackend()
+    text = "\n".join(["frase " * 500] * 8)
+
+    start = time.perf_counter()
+    translated = translator.translate(text)
+    elapsed = time.perf_counter() - start
+
+    assert translated == text.upper()
+    assert backend.n_requests == 8
+    assert elapsed < 0.5
@@ -1,4 +1,29 @@
-from src.data import load_dsl_tl, load_pt_vid
+import json
+
+import pyarrow as pa
+import pytest
+from datasets.table import MemoryMappedTable
+
+import src.data
+from src.data import (
+    TranslationDataset,
+    in_part,
+    load_dsl_tl,
+    load_pt_vid,
+    merge_shards,
+    merge_workers,
+    parse_part,
+    shard_name,
+    shards_path,
+    translation_table,
+    worker_name,
+)
+
+
+@pytest.fixture
+def data_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(src.data, "DATA_PATH", tmp_path)
+    return tmp_path
 
 
 def test_load_dsl_tl():
@@ -20,3 +45,212 @@ def test_load_pt_vid():
         assert "test" in data[domain]
         assert isinstance(data[domain]["train"][0], str)
         assert isinstance(data[domain]["test"][0], str)
+
+
+class TestTranslationDataset:
+    def test_json_roundtrip(self, data_path):
+        ds = TranslationDataset("test")
+        ds.add(0, {"pt": "Olá", "en": "Hello"})
+        ds.save()
+        assert json.load((data_path / "test.json").open()) == {
+            "0": {"pt": "Olá", "en": "Hello"}
+        }
+        assert "0" in TranslationDataset("test")
+
+    def test_journal_appends_only_new_records(self, data_path):
+        ds = TranslationDataset("test", storage="journal")
+        ds.add(0, {"pt": "Olá", "en": "Hello"})
+        ds.save()
+        ds.add(1, {"pt": "Adeus", "en": "Goodbye"})
+        ds.save()
+        ds.save()
+        lines = (data_path / "test.jsonl").read_text().splitlines()
+        assert len(lines) == 2
+        assert not (data_path / "test.json").exists()
+
+        loaded = TranslationDataset("test")
+        assert len(loaded) == 2
+        assert sorted(loaded.ids) == ["0", "1"]
+
+    def test_journal_compact(self, data_path):
+        ds = TranslationDataset("test", storage="journal")
+        ds.add(0, {"pt": "Olá", "en": "Hello"})
+        ds.save()
+        ds.compact()
+        assert not (data_path / "test.jsonl").exists()
+
+        ds = TranslationDataset("test", storage="journal")
+        ds.add(1, {"pt": "Adeus", "en": "Goodbye"})
+        ds.save()
+        loaded = TranslationDataset("test")
+        assert sorted(loaded.ids) == ["0", "1"]
+
+    def test_journal_truncated_record(self, data_path):
+        ds = TranslationDataset("test", storage="journal")
+        ds.add(0, {"pt": "Olá", "en": "Hello"})
+        ds.save()
+        with (data_path / "test.jsonl").open("a") as fout:
+            fout.write('{"id": 1, "data": {"pt": "Ad')
+
+        ds = TranslationDataset("test", storage="journal")
+        assert ds.ids == ["0"]
+        ds.add(2, {"pt": "Sim", "en": "Yes"})
+        ds.save()
+        assert sorted(TranslationDataset("test").ids) == ["0", "2"]
+
+    def test_arrow_roundtrip(self, data_path):
+        ds = TranslationDataset("test", storage="arrow")
+        ds.add(0, {"source": "pt_vid", "pt": "Olá", "en": "Hello"})
+        ds.save()
+        assert (data_path / "test.jsonl").exists()
+        ds.compact()
+        assert not (data_path / "test.jsonl").exists()
+        assert (data_path / "test.arrow").exists()
+
+        loaded = TranslationDataset("test")
+        assert dict(loaded) == {"0": {"source": "pt_vid", "pt": "Olá", "en": "Hello"}}
+        loaded.compact()
+        assert (data_path / "test.json").exists()
+        assert not (data_path / "test.arrow").exists()
+
+    def test_failed_compact(self, data_path):
+        ds = TranslationDataset("test", storage="arrow")
+        ds.add(0, {"pt": "Olá"})
+        ds.add(1, {"pt": 1})
+        with pytest.raises(pa.ArrowException):
+            ds.compact()
+        assert list(data_path.iterdir()) == []
+
+    def test_to_arrow(self, data_path):
+        ds = TranslationDataset("test")
+        ds.add(0, {"source": "pt_vid", "domain": "web", "pt": "Olá"})
+        ds.add(1, {"source": "pt_vid", "domain": "legal", "pt": "Adeus"})
+        table = ds.to_arrow()
+        assert table.column_names == ["id", "source", "domain", "pt"]
+        assert table["id"].to_pylist() == ["0", "1"]
+        assert pa.types.is_dictionary(table.schema.field("domain").type)
+        assert not pa.types.is_dictionary(table.schema.field("pt").type)
+
+    def test_invalid_storage(self, data_path):
+        with pytest.raises(ValueError):
+            TranslationDataset("test", storage="parquet")
+
+
+def test_parse_part():
+    assert parse_part("1/4") == (1, 4)
+    for part in ["4/4", "-1/4", "1", "a/b"]:
+        with pytest.raises(ValueError):
+            parse_part(part)
+
+
+def test_in_part():
+    parts = [[id for id in range(10) if in_part(id, index, 3)] for index in range(3)]
+    assert sorted(sum(parts, [])) == list(range(10))
+
+
+class TestMergeShards:
+    def write_shards(self, ids_by_shard):
+        count = len(ids_by_shard)
+        for index, ids in enumerate(ids_by_shard):
+            shard = TranslationDataset(
+                shard_name("test", index, count), directory=shards_path()
+            )
+            for id in ids:
+                shard.add(id, {"idx": id})
+            shard.save()
+
+    def test_merge(self, data_path):
+        self.write_shards([[0, 2], [1, 3]])
+        merged = merge_shards("test", 2, expected_ids=range(4))
+        assert sorted(map(int, merged.ids)) == [0, 1, 2, 3]
+        assert sorted(map(int, TranslationDataset("test").ids)) == [0, 1, 2, 3]
+
+    def test_merge_keeps_existing(self, data_path):
+        ds = TranslationDataset("test")
+        ds.add(1, {"idx": 1, "existing": True})
+        ds.save()
+        self.write_shards([[0, 2], [1, 3]])
+        merged = merge_shards("test", 2, expected_ids=range(4))
+        assert len(merged) == 4
+        assert dict(merged)["1"] == {"idx": 1, "existing": True}
+
+    def test_merge_arrow(self, data_path):
+        for index, ids in enumerate([[0, 2], [1]]):
+            shard = TranslationDataset(
+                shard_name("test", index, 2), storage="arrow", directory=shards_path()
+            )
+            for id in ids:
+                shard.add(id, {"idx": id})
+            shard.compact()
+        merged = merge_shards("test", 2, expected_ids=range(3))
+        assert sorted(map(int, merged.ids)) == [0, 1, 2]
+        assert sorted(path.name for path in data_path.glob("test.*")) == ["test.arrow"]
+
+    def test_merge_storage(self, data_path):
+        self.write_shards([[0, 2], [1, 3]])
+        merge_shards("test", 2, storage="arrow")
+        assert sorted(path.name for path in data_path.glob("test.*")) == ["test.arrow"]
+        merge_shards("test", 2, storage="json")
+        assert sorted(path.name for path in data_path.glob("test.*")) == ["test.json"]
+
+    def test_missing_shard(self, data_path):
+        self.write_shards([[0, 2], [1]])
+        with pytest.raises(FileNotFoundError):
+            merge_shards("test", 3)
+
+    def test_overlap(self, data_path):
+        self.write_shards([[0, 1], [1, 3]])
+        with pytest.raises(ValueError):
+            merge_shards("test", 2)
+        assert not (data_path / "test.json").exists()
+
+    def test_gaps(self, data_path):
+        self.write_shards([[0], [1, 3]])
+        with pytest.raises(ValueError):
+            merge_shards("test", 2, expected_ids=range(4))
+        merged = merge_shards("test", 2, expected_ids=range(4), allow_gaps=True)
+        assert len(merged) == 3
+
+
+def test_merge_workers(data_path):
+    outputs = {"a": [0, 1, 2], "b": [2, 3]}
+    for worker, ids in outputs.items():
+        output = TranslationDataset(
+            worker_name("test", worker), storage="journal", directory=shards_path()
+        )
+        for id in ids:
+            output.add(id, {"worker": worker})
+        output.save()
+    merged = merge_workers("test", expected_ids=range(4))
+    assert dict(merged)["2"] == {"worker": "a"}
+    assert sorted(map(int, merged.ids)) == [0, 1, 2, 3]
+    with pytest.raises(FileNotFoundError):
+        merge_workers("other")
+
+
+def test_merge_arrow_workers(data_path):
+    for worker, ids in {"a": [0, 1], "b": [2]}.items():
+        output = TranslationDataset(
+            worker_name("test", worker), storage="arrow", directory=shards_path()
+        )
+        for id in ids:
+            output.add(id, {"worker": worker})
+        output.compact()
+    merged = merge_workers("test", expected_ids=range(3))
+    assert [data["worker"] for _, data in sorted(merged)] == ["a", "a", "b"]
+    assert sorted(path.name for path in data_path.glob("test.*")) == ["test.arrow"]
+
+
+@pytest.mark.parametrize("storage", ["journal", "arrow"])
+def test_translation_table(data_path, storage):
+    ds = TranslationDataset("test", storage=storage)
+    ds.add(0, {"source": "pt_vid", "pt": "Olá"})
+    ds.save()
+    ds.compact()
+    files = sorted(path.name for path in data_path.iterdir())
+
+    table = translation_table("test")
+    assert sorted(path.name for path in data_path.iterdir()) == files
+    assert isinstance(table, MemoryMappedTable) == (storage == "arrow")
+    assert table.schema.field("source").type == pa.string()
+    assert table.to_pylist() == [{"id": "0", "source": "pt_vid", "pt": "Olá"}]
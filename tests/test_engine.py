@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+from src.engine import translate_stream
+
+
+def collect(translate, items, concurrency):
+    async def run():
+        return [
+            result async for result in translate_stream(translate, items, concurrency)
+        ]
+
+    return asyncio.run(run())
+
+
+def test_translate_stream():
+    items = [(idx, f"text {idx}") for idx in range(20)]
+    results = collect(str.upper, items, concurrency=4)
+    assert sorted(results) == [(idx, text, text.upper()) for idx, text in items]
+
+
+def test_translate_stream_no_batch_barrier():
+    def translate(text):
+        time.sleep(0.5 if text == "slow" else 0.01)
+        return text
+
+    items = [(0, "slow")] + [(idx, "fast") for idx in range(1, 21)]
+    start = time.perf_counter()
+    results = collect(translate, items, concurrency=2)
+    elapsed = time.perf_counter() - start
+
+    assert results[-1] == (0, "slow", "slow")
+    assert elapsed < 0.7
+
+
+def test_translate_stream_error():
+    def translate(text):
+        if text == "bad":
+            raise RuntimeError("boom")
+        return text
+
+    results = collect(translate, [(0, "good"), (1, "bad")], concurrency=2)
+    assert sorted(results) == [(0, "good", "good"), (1, "bad", None)]
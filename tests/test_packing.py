@@ -0,0 +1,61 @@
+import asyncio
+
+from src import packing
+from src.translator import Translator
+
+
+class CountingBackend:
+    def __init__(self):
+        self.n_requests = 0
+
+    def translate(self, text):
+        self.n_requests += 1
+        return text.upper()
+
+
+def test_pack():
+    items = [(0, "a" * 10), (1, "b" * 10), (2, "c" * 10), (3, "d" * 40), (4, "e")]
+    groups = list(packing.pack(items, max_chars=30))
+    assert [[id for id, _ in group] for group in groups] == [[0, 1], [2], [3], [4]]
+
+
+def test_pack_unpackable():
+    items = [(0, "a"), (1, " "), (2, "b [[1]] c"), (3, "d")]
+    groups = list(packing.pack(items, max_chars=100))
+    assert [[id for id, _ in group] for group in groups] == [[0], [1], [2], [3]]
+
+
+def test_join_split():
+    texts = ["Olá.", "Tudo bem?\nSim.", "Adeus"]
+    assert packing.split(packing.join(texts), len(texts)) == texts
+    assert packing.split("Hello. [[ 1 ]] All good?\nYes.[[2]]Bye", 3) == [
+        "Hello.",
+        "All good?\nYes.",
+        "Bye",
+    ]
+    assert packing.split("Hello. [[2]] All good? [[1]] Bye", 3) is None
+    assert packing.split("Hello. All good? [[1]] Bye", 3) is None
+
+
+def test_translate_batch():
+    translator = Translator(source="pt", target="en", backend="identity")
+    backend = translator._engine = CountingBackend()
+    texts = [f"texto número {idx}" for idx in range(50)]
+    assert translator.translate_batch(texts) == [text.upper() for text in texts]
+    assert backend.n_requests == 1
+
+
+def test_translate_batch_fallback():
+    translator = Translator(source="pt", target="en", backend="reverse")
+    texts = ["olá", "mundo"]
+    assert translator.translate_batch(texts) == ["álo", "odnum"]
+
+
+def test_stream_packed():
+    translator = Translator(source="pt", target="en", backend="identity")
+    items = [(idx, f"texto {idx}") for idx in range(10)]
+
+    async def run():
+        return [result async for result in translator.stream(items, 2, pack=True)]
+
+    assert sorted(asyncio.run(run())) == [(id, text, text) for id, text in items]
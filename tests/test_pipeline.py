@@ -0,0 +1,148 @@
+import datasets
+import pytest
+
+import src.process
+from src.pipeline import Pipeline, Stage, describe, from_stream
+from src.process import (
+    add_n_tokens,
+    drop_duplicates,
+    drop_duplicates_start_ends,
+    huggingface_dataset_filter,
+    huggingface_dataset_transform,
+    stream_clean,
+)
+from src.profiling import Profiler
+
+CALLS = []
+SUFFIX = "!"
+
+
+def upper(dataset):
+    CALLS.append("upper")
+    return dataset.map(lambda x: {"text": x["text"].upper()})
+
+
+def suffix(dataset, n=1):
+    CALLS.append("suffix")
+    return dataset.map(lambda x: {"text": x["text"] + SUFFIX * n})
+
+
+class Repeater:
+    def __init__(self, n):
+        self.n = n
+
+    def __call__(self, text):
+        return text * self.n + SUFFIX
+
+
+def stream_suffix(rows):
+    for row in rows:
+        yield {"text": row["text"] + SUFFIX}
+
+
+def repeat(dataset, n=2):
+    repeater = Repeater(n)
+    return dataset.map(lambda x: {"text": repeater(x["text"])})
+
+
+@pytest.fixture
+def dataset():
+    CALLS.clear()
+    return datasets.Dataset.from_dict({"text": ["a", "b"]})
+
+
+def test_describe_follows_references(monkeypatch):
+    before = describe(suffix)
+    monkeypatch.setitem(suffix.__globals__, "SUFFIX", "?")
+    assert describe(suffix) != before
+    assert describe(upper) == describe(upper)
+
+
+def test_describe_follows_classes(monkeypatch):
+    before = describe(repeat)
+    assert describe(Repeater(1)) == describe(Repeater)
+    monkeypatch.setitem(suffix.__globals__, "SUFFIX", "?")
+    assert describe(repeat) != before
+    assert describe(datasets.Dataset) == "Dataset"
+
+
+class TestPipeline:
+    def test_run(self, dataset, tmp_path):
+        pipeline = Pipeline([Stage("upper", upper), Stage("suffix", suffix)], tmp_path)
+        assert pipeline.run(dataset)["text"] == ["A!", "B!"]
+        assert CALLS == ["upper", "suffix"]
+        assert len(list(tmp_path.iterdir())) == 2
+
+    def test_resume(self, dataset, tmp_path):
+        Pipeline([Stage("upper", upper), Stage("suffix", suffix)], tmp_path).run(
+            dataset
+        )
+        CALLS.clear()
+
+        pipeline = Pipeline([Stage("upper", upper), Stage("suffix", suffix)], tmp_path)
+        assert pipeline.run(dataset)["text"] == ["A!", "B!"]
+        assert CALLS == []
+
+    def test_changed_params_reruns_from_stage(self, dataset, tmp_path):
+        Pipeline([Stage("upper", upper), Stage("suffix", suffix)], tmp_path).run(
+            dataset
+        )
+        CALLS.clear()
+
+        pipeline = Pipeline(
+            [Stage("upper", upper), Stage("suffix", suffix, n=2)], tmp_path
+        )
+        assert pipeline.run(dataset)["text"] == ["A!!", "B!!"]
+        assert CALLS == ["suffix"]
+
+    def test_force(self, dataset, tmp_path):
+        pipeline = Pipeline([Stage("upper", upper)], tmp_path)
+        pipeline.run(dataset)
+        pipeline.run(dataset, force=True)
+        assert CALLS == ["upper", "upper"]
+
+    def test_profiler(self, dataset, tmp_path):
+        def count(dataset, profiler=None):
+            profiler.add_predicates({"rows": {"seconds": 0.0, "rejections": 2}})
+            return dataset
+
+        stage = Stage("count", count)
+        before = stage.fingerprint("input")
+        profiler = Profiler()
+        Pipeline([stage], tmp_path).run(dataset, profiler=profiler)
+        assert profiler.predicates["rows"]["rejections"] == 2
+        assert [record["name"] for record in profiler.stages] == ["count"]
+        assert stage.fingerprint("input") == before
+
+
+class WhitespaceTokenizer:
+    def __call__(self, texts, add_special_tokens=True):
+        return {"input_ids": [text.split() for text in texts]}
+
+
+class TestFromStream:
+    def test_from_stream(self, dataset, tmp_path, monkeypatch):
+        rows = dataset.to_iterable_dataset()
+        assert from_stream(stream_suffix, rows, tmp_path)["text"] == ["a!", "b!"]
+        # A change of the code the generator uses isn't served from the cache.
+        monkeypatch.setitem(stream_suffix.__globals__, "SUFFIX", "?")
+        assert from_stream(stream_suffix, rows, tmp_path)["text"] == ["a?", "b?"]
+        other = datasets.Dataset.from_dict({"text": ["c"]}).to_iterable_dataset()
+        assert from_stream(stream_suffix, other, tmp_path)["text"] == ["c?"]
+
+    def test_stream_clean_matches_pipeline(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(src.process, "get_tokenizer", WhitespaceTokenizer)
+        text = "O jogo acabou empatado depois de uma segunda parte muito disputada."
+        texts = [text, text, "@benfica " + text.replace("jogo", "treino"), "Curto"]
+        dataset = datasets.Dataset.from_dict({"pt": texts, "en": texts})
+
+        stages = [
+            Stage("duplicates", drop_duplicates),
+            Stage("duplicates_start_ends", drop_duplicates_start_ends, n_chars=60),
+            Stage("transform", huggingface_dataset_transform),
+            Stage("n_tokens", add_n_tokens),
+            Stage("filter", huggingface_dataset_filter),
+        ]
+        expected = Pipeline(stages, tmp_path).run(dataset)
+        streamed = from_stream(stream_clean, dataset.to_iterable_dataset(), tmp_path)
+        assert streamed.to_list() == expected.to_list()
@@ -1,3 +1,11 @@
+from pathlib import Path
+
+import datasets
+import pyarrow as pa
+import pytest
+
+import src.process
+from src.profiling import Profiler
 from src.process import (
     has_hashtag,
     has_html_tags,
@@ -22,14 +30,116 @@ from src.process import (
     has_more_than_three_points,
     has_valid_brackets,
     has_invalid_character,
+    has_invalid_end,
+    match_invalid_pattern,
+    add_n_tokens,
+    valid_n_tokens_counts,
+    VALID_CHARS,
+    drop_invalid_characters,
+    find_invalid_characters,
+    has_invalid_character_batch,
+    drop_duplicates,
+    drop_duplicates_start_ends,
+    hash_text,
+    drop_near_duplicates,
+    lsh_params,
+    minhash_permutations,
+    minhash_signature,
+    rejection_reason,
+    tag_rejection_reasons,
+    huggingface_dataset_filter,
+    huggingface_dataset_transform,
+    HashSet,
+    rejection_stats,
+    drop_justext_bad_class,
+    is_good_quality_batch,
+    is_justext_good_class,
+    justext_agreement,
+    transform_text,
+    stream_clean,
+    stream_drop_duplicates,
+    stream_drop_duplicates_start_ends,
 )
 
 
+class WhitespaceTokenizer:
+    def __call__(self, texts, add_special_tokens=True):
+        return {"input_ids": [text.split() for text in texts]}
+
+
 def test_valid_n_tokens():
     assert not valid_n_tokens("Hi")
     assert not valid_n_tokens("Crianças. Kids.")
 
 
+def test_add_n_tokens(monkeypatch):
+    monkeypatch.setattr(src.process, "get_tokenizer", WhitespaceTokenizer)
+    dataset = datasets.Dataset.from_dict(
+        {"pt": ["Olá mundo", "Adeus"], "en": ["Hello world !", "Bye"]}
+    )
+    dataset = add_n_tokens(dataset)
+    assert dataset["n_tokens_pt"] == [2, 1]
+    assert dataset["n_tokens_en"] == [3, 1]
+
+
+def test_valid_n_tokens_counts():
+    assert valid_n_tokens_counts(5, 5)
+    assert not valid_n_tokens_counts(4, 5)
+    assert not valid_n_tokens_counts(500, 401)
+
+
+def test_rejection_reason():
+    text = "O jogo acabou empatado depois de uma segunda parte muito disputada."
+    row = {"pt": text, "en": text, "n_tokens_pt": 11, "n_tokens_en": 11}
+    assert rejection_reason(row) is None
+    assert rejection_reason({**row, "n_tokens_pt": 900}) == "max_tokens/n_tokens"
+    assert rejection_reason({**row, "pt": "©" + text}) == (
+        "invalid_chars/invalid_character_pt"
+    )
+    assert rejection_reason({**row, "en": "Sort by " + text}) == (
+        "patterns/invalid_pattern_en"
+    )
+
+
+def test_tag_rejection_reasons(monkeypatch):
+    monkeypatch.setattr(src.process, "get_tokenizer", WhitespaceTokenizer)
+    text = "O jogo acabou empatado depois de uma segunda parte muito disputada."
+    dataset = datasets.Dataset.from_dict(
+        {"pt": [text, "Curto", "©" + text], "en": [text, "Short", text]}
+    )
+    dataset = tag_rejection_reasons(dataset)
+    assert dataset["rejection_reason"] == [
+        None,
+        "max_tokens/n_tokens",
+        "invalid_chars/invalid_character_pt",
+    ]
+
+
+def test_rejection_stats(monkeypatch):
+    monkeypatch.setattr(src.process, "get_tokenizer", WhitespaceTokenizer)
+    text = "O jogo acabou empatado depois de uma segunda parte muito disputada."
+    dataset = datasets.Dataset.from_dict(
+        {"pt": [text, "Curto", "©" + text], "en": [text, "Short", text]}
+    )
+    stats = rejection_stats(tag_rejection_reasons(dataset, timed=True))
+    assert stats["max_tokens/n_tokens"]["rejections"] == 1
+    assert stats["invalid_chars/invalid_character_pt"]["rejections"] == 1
+    assert stats["misc/empty_pt"]["rejections"] == 0
+    assert all(stat["seconds"] >= 0 for stat in stats.values())
+
+
+def test_huggingface_dataset_filter_profiler(monkeypatch):
+    monkeypatch.setattr(src.process, "get_tokenizer", WhitespaceTokenizer)
+    text = "O jogo acabou empatado depois de uma segunda parte muito disputada."
+    dataset = datasets.Dataset.from_dict(
+        {"pt": [text, "Curto", "©" + text], "en": [text, "Short", text]}
+    )
+    profiler = Profiler()
+    filtered = huggingface_dataset_filter(dataset, profiler)
+    assert filtered.to_list() == huggingface_dataset_filter(dataset).to_list()
+    assert sum(stat["rejections"] for stat in profiler.predicates.values()) == 2
+
+
 def test_has_hashtag():
     assert has_hashtag("this has an #hashtag.")
     assert not has_hashtag("this does not.")
@@ -114,11 +224,54 @@ def test_remove_html_tags():
     )
 
 
+def test_remove_html_tags_matches_beautifulsoup():
+    bs4 = pytest.importorskip("bs4")
+    texts = [
+        "Sem marcação nenhuma.",
+        "",
+        " \r\n ",
+        "Tom &amp; Jerry &foo; &#233; &#x41; &nbsp;fim &amp",
+        "<p>Olá</p>\n<p>mundo</p><br/>",
+        "<script>var x = 1 < 2;</script><style>p {}</style>texto",
+        "<!DOCTYPE html><!-- comentário --><title>Título</title><![CDATA[dados]]>",
+        "<pre> </pre>a<b c <3 </",
+        # Malformed markup: implicitly closed and unmatched elements.
+        "<p><pre>x</p>\r\n",
+        "<div><textarea> a </div>  <b> b </b></i>\n",
+        "<div><template><p>x</div>y",
+        "<pre>a<br> </br> </pre>  <br>\r\n</br>\t",
+        "<ruby>漢<rp>(</rp><rt>kan</rt><rp>)</rp></ruby>字",
+    ]
+    for text in texts:
+        expected = bs4.BeautifulSoup(text, "html.parser").get_text()
+        assert remove_html_tags(text) == expected
+
+
 def test_has_invalid_middle():
     assert has_invalid_middle("List of recent / changes")
     assert has_invalid_middle("List of recent @ changes")
 
 
+def test_has_invalid_end():
+    assert has_invalid_end("This ends with an open (")
+    assert not has_invalid_end("This ends with a closed ()")
+
+
+def test_match_invalid_pattern():
+    assert match_invalid_pattern("Sort by name") == ("invalid_start", "Sort by")
+    assert match_invalid_pattern("Home Page of the site") == (
+        "invalid_start",
+        "Home Page",
+    )
+    assert match_invalid_pattern("List of recent / changes") == (
+        "invalid_middle",
+        " / ",
+    )
+    assert match_invalid_pattern("This ends with an open (") == ("invalid_end", " (")
+    assert match_invalid_pattern("This is a valid sentence.") is None
+    assert match_invalid_pattern("Sort by name", rules=("invalid_end",)) is None
+
+
 def test_remove_cod_literature():
     assert (
         remove_cod_literature(
@@ -190,6 +343,33 @@ def test_has_invalid_character():
     assert not has_invalid_character("Há 10 anos, a 1 de outubro de 2010.")
 
 
+def test_has_invalid_character_matches_lowercase_lookup():
+    chars = [chr(code) for code in range(0x3000)] + ["İ", "K", "Å", "𝗣"]
+    for char in chars:
+        assert has_invalid_character(char) == (char.lower() not in VALID_CHARS), char
+
+
+def test_find_invalid_characters():
+    assert find_invalid_characters("©This is a sentence with a ©™") == ["©", "™"]
+    assert find_invalid_characters("This is a valid sentence") == []
+
+
+def test_has_invalid_character_batch():
+    texts = ["©This is a sentence with a ©", "O «Recodme» passou a ser", "", "ÀÉÎ"]
+    expected = [True, False, False, False]
+    assert has_invalid_character_batch(texts) == expected
+    assert has_invalid_character_batch(pa.array(texts)).to_pylist() == expected
+
+
+def test_drop_invalid_characters():
+    dataset = datasets.Dataset.from_dict(
+        {"pt": ["©Texto", "Texto válido", "𝗣𝗿𝗼𝗽𝗼𝘀𝘁𝗮𝘀"], "en": ["a", "b", "c"]}
+    )
+    dataset = drop_invalid_characters(dataset)
+    assert dataset["pt"] == ["Texto válido"]
+    assert dataset["en"] == ["b"]
+
+
 def test_remove_quote_space_start():
     assert remove_quote_space_start('" This is a sentence with a quote"') == '"This is a sentence with a quote"'
     assert remove_quote_space_start('" This is "a sentence with a quote"') == '"This is "a sentence with a quote"'
@@ -200,3 +380,162 @@ def test_remove_quote_space_end():
     assert remove_quote_space_end('This is a sentence with a quote "') == 'This is a sentence with a quote"'
     assert remove_quote_space_end('This is "a sentence with a quote "') == 'This is "a sentence with a quote"'
     assert remove_quote_space_end('This is " a sentence with a quote "') == 'This is " a sentence with a quote"'
+
+
+def test_hash_text():
+    assert hash_text("Olá mundo") == hash_text("Olá mundo")
+    assert hash_text("Olá mundo") != hash_text("Olá mundo!")
+    assert 0 <= hash_text("") < 2**64
+
+
+def test_drop_duplicates():
+    dataset = datasets.Dataset.from_dict(
+        {"pt": ["b", "a", "b", "c", "a"], "idx": [0, 1, 2, 3, 4]}
+    )
+    assert drop_duplicates(dataset)["idx"] == [0, 1, 3]
+
+
+def test_drop_duplicates_start_ends():
+    pt = [
+        "Olá mundo, isto é um texto.",
+        "Olá mundo, isto é outro texto.",
+        "Adeus mundo, isto é um texto.",
+        "Um texto novo.",
+    ]
+    dataset = datasets.Dataset.from_dict({"pt": pt, "idx": [0, 1, 2, 3]})
+    assert drop_duplicates_start_ends(dataset, n_chars=5)["idx"] == [0, 3]
+
+
+def test_lsh_params():
+    n_bands, n_rows = lsh_params(threshold=0.8, num_perm=128)
+    assert n_bands * n_rows <= 128
+    assert 0.7 < (1 / n_bands) ** (1 / n_rows) < 0.9
+
+
+def test_minhash_signature():
+    permutations = minhash_permutations(128)
+    text = "O Benfica venceu o jogo de ontem por dois golos a zero no Estádio da Luz."
+    signature = minhash_signature(text, permutations)
+    assert signature.shape == (128,)
+    assert (signature == minhash_signature(text, permutations)).all()
+    similar = minhash_signature(text + " 12:30", permutations)
+    different = minhash_signature("Uma frase completamente diferente.", permutations)
+    assert (signature == similar).mean() > 0.8
+    assert (signature == different).mean() < 0.2
+
+
+def test_drop_near_duplicates():
+    text = (
+        "O Benfica venceu o jogo de ontem por dois golos a zero no Estádio da Luz. "
+        "O treinador elogiou a atitude dos jogadores e a resposta dos adeptos, que "
+        "encheram as bancadas apesar da chuva que caiu durante toda a partida."
+    )
+    pt = [
+        text + " 2024-01-01 12:30",
+        "Uma frase completamente diferente, sobre outro assunto qualquer.",
+        text + " 2024-01-02 18:45",
+        text,
+    ]
+    dataset = datasets.Dataset.from_dict({"pt": pt, "idx": [0, 1, 2, 3]})
+    assert drop_near_duplicates(dataset)["idx"] == [0, 1]
+
+
+def test_hash_set():
+    hashes = HashSet(capacity=4)
+    assert all(hashes.add(value) for value in [0, 3, 2**64 - 1, *range(10, 100)])
+    assert not hashes.add(3)
+    assert not hashes.add(2**64 - 1)
+    assert len(hashes) == 93
+
+
+def test_stream_drop_duplicates():
+    rows = [{"pt": text} for text in ["a", "b", "a", "c", "b"]]
+    assert [row["pt"] for row in stream_drop_duplicates(rows)] == ["a", "b", "c"]
+
+
+def test_stream_drop_duplicates_start_ends():
+    texts = ["abc xyz", "abc uvw", "def xyz", "def uvw", "ghi rst"]
+    rows = [{"pt": text} for text in texts]
+    kept = stream_drop_duplicates_start_ends(rows, n_chars=3)
+    assert [row["pt"] for row in kept] == ["abc xyz", "ghi rst"]
+
+
+def test_stream_clean(monkeypatch):
+    monkeypatch.setattr(src.process, "get_tokenizer", WhitespaceTokenizer)
+    text = "O jogo acabou empatado depois de uma segunda parte muito disputada."
+    texts = [text, text, "@benfica " + text.replace("jogo", "treino"), "Curto"]
+    dataset = datasets.Dataset.from_dict({"pt": texts, "en": texts})
+
+    expected = drop_duplicates_start_ends(drop_duplicates(dataset))
+    expected = huggingface_dataset_filter(
+        add_n_tokens(huggingface_dataset_transform(expected))
+    )
+    assert list(stream_clean(dataset.to_iterable_dataset())) == expected.to_list()
+
+
+def test_transform_text():
+    def sequential(text):
+        for remove in [
+            remove_retweets,
+            remove_mentions,
+            remove_hashtags,
+            remove_urls,
+            remove_html_tags,
+            remove_cod_literature,
+            remove_bullets,
+            remove_three_dashes,
+            remove_quote_space_start,
+            remove_quote_space_end,
+        ]:
+            text = remove(text)
+        return text
+
+    texts = [
+        "",
+        "  Texto simples.  ",
+        "RT @user: Golo do Benfica! #futebol",
+        "Escreve para exa@foo.com hoje",
+        "COD _ x <p>texto</p>",
+        "<b>1. Primeiro</b>",
+        '" Citação --- nota --- "',
+        "Tom &amp; Jerry",
+    ]
+    for text in texts:
+        assert transform_text(text) == sequential(text)
+
+
+def test_huggingface_dataset_transform():
+    dataset = datasets.Dataset.from_dict(
+        {
+            "pt": ["RT @a: Olá #pt", "<p>Adeus</p>"],
+            "en": ["Hi @b", "Bye"],
+            "idx": [0, 1],
+        }
+    )
+    dataset = huggingface_dataset_transform(dataset)
+    assert dataset.to_list() == [
+        {"pt": "Olá", "en": "Hi", "idx": 0},
+        {"pt": "Adeus", "en": "Bye", "idx": 1},
+    ]
+
+
+def test_is_good_quality_batch():
+    text = (Path(__file__).parent / "long_text.txt").read_text()
+    texts = [
+        text[:1000],
+        text[:100],
+        "© " + text[:1000],
+        "The quick brown fox jumps over the lazy dog. " * 10,
+        text[:1000] + " <3 & mais",
+        "",
+    ]
+    expected = [bool(text.strip()) and is_justext_good_class(text) for text in texts]
+    assert is_good_quality_batch(texts) == expected
+    assert expected[:4] == [True, False, False, False]
+    assert justext_agreement(texts) == 1.0
+
+
+def test_drop_justext_bad_class():
+    text = (Path(__file__).parent / "long_text.txt").read_text()
+    dataset = datasets.Dataset.from_dict({"pt": [text[:1000], text[:100]]})
+    assert drop_justext_bad_class(dataset)["pt"] == [text[:1000]]
@@ -0,0 +1,48 @@
+import csv
+import json
+
+import datasets
+
+from src.profiling import Profiler
+
+
+def test_stage():
+    profiler = Profiler()
+    with profiler.stage("double", rows_in=2) as record:
+        record["rows_out"] = 4
+    (stage,) = profiler.stages
+    assert stage["name"] == "double"
+    assert (stage["rows_in"], stage["rows_out"]) == (2, 4)
+    assert stage["seconds"] >= 0
+    assert stage["process_peak_rss_mb"] > 0
+    assert stage["peak_rss_increase_mb"] >= 0
+
+
+def test_run_stage():
+    profiler = Profiler()
+    dataset = datasets.Dataset.from_dict({"text": ["a", "b", "c"]})
+    output = profiler.run_stage("head", lambda x: x.select([0]), dataset)
+    assert len(output) == 1
+    assert (profiler.stages[0]["rows_in"], profiler.stages[0]["rows_out"]) == (3, 1)
+
+
+def test_add_predicates():
+    profiler = Profiler()
+    profiler.add_predicates({"misc/empty": {"seconds": 1.0, "rejections": 2}})
+    profiler.add_predicates({"misc/empty": {"seconds": 0.5, "rejections": 1}})
+    assert profiler.predicates == {"misc/empty": {"seconds": 1.5, "rejections": 3}}
+
+
+def test_save(tmp_path):
+    profiler = Profiler()
+    with profiler.stage("filter", rows_in=10) as record:
+        record["rows_out"] = 5
+    profiler.add_predicates({"misc/empty": {"seconds": 0.1, "rejections": 5}})
+    profiler.save(tmp_path / "report")
+
+    records = json.loads((tmp_path / "report.json").read_text())
+    assert [record["kind"] for record in records] == ["stage", "predicate"]
+    with (tmp_path / "report.csv").open() as fin:
+        rows = list(csv.DictReader(fin))
+    assert rows[0]["name"] == "filter"
+    assert rows[1]["rejections"] == "5"
@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+
+from src.backends import TransientError
+from src.ratelimit import AIMDLimiter, Retry, TokenBucket
+from src.translator import Translator
+
+
+class FlakyBackend:
+    def __init__(self, n_failures, error=TransientError("429 Too Many Requests")):
+        self.n_failures = n_failures
+        self.error = error
+        self.n_requests = 0
+
+    def translate(self, text):
+        self.n_requests += 1
+        if self.n_requests <= self.n_failures:
+            raise self.error
+        return text
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.perf_counter()
+    for _ in range(11):
+        bucket.acquire()
+    assert time.perf_counter() - start >= 0.19
+
+
+def test_aimd_limiter():
+    limiter = AIMDLimiter(initial=4, minimum=1, maximum=5)
+    for _ in range(4):
+        limiter.acquire()
+    for _ in range(4):
+        limiter.release(success=True)
+    assert limiter.limit == 4
+    limiter.acquire()
+    limiter.release(success=True)
+    assert limiter.limit == 5
+
+    limiter.acquire()
+    limiter.release(success=False)
+    assert limiter.limit == 2
+
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release(success=False)
+    assert limiter.limit == 1
+
+
+def test_aimd_limiter_decreases_once_per_window():
+    limiter = AIMDLimiter(initial=32, maximum=32)
+    windows = [limiter.acquire() for _ in range(32)]
+    for window in windows:
+        limiter.release(success=False, window=window)
+    assert limiter.limit == 16
+
+    window = limiter.acquire()
+    limiter.release(success=False, window=window)
+    assert limiter.limit == 8
+
+
+def test_aimd_limiter_ignores_permanent_failures():
+    limiter = AIMDLimiter(initial=4)
+    window = limiter.acquire()
+    limiter.release(success=False, window=window, throttled=False)
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
+
+
+def test_aimd_limiter_blocks():
+    limiter = AIMDLimiter(initial=1)
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def acquire():
+        limiter.acquire()
+        acquired.set()
+
+    threading.Thread(target=acquire).start()
+    assert not acquired.wait(0.1)
+    limiter.release(success=True)
+    assert acquired.wait(1)
+
+
+def test_retry_delay():
+    retry = Retry(base=1.0, cap=3.0)
+    assert all(0 <= retry.delay(attempt) <= 3.0 for attempt in range(10))
+
+
+def test_translator_retry():
+    limiter = AIMDLimiter(initial=4)
+    translator = Translator(
+        source="pt",
+        target="en",
+        backend="identity",
+        concurrency_limiter=limiter,
+        retry=Retry(max_retries=2, base=0.001),
+    )
+    backend = translator._engine = FlakyBackend(n_failures=2)
+    assert translator.translate("olá") == "olá"
+    assert backend.n_requests == 3
+    assert limiter.limit == 2
+    assert limiter.in_flight == 0
+
+    backend = translator._engine = FlakyBackend(n_failures=3)
+    with pytest.raises(TransientError):
+        translator.translate("olá")
+    assert limiter.in_flight == 0
+
+
+def test_translator_permanent_error():
+    limiter = AIMDLimiter(initial=4)
+    translator = Translator(
+        source="pt",
+        target="en",
+        backend="identity",
+        concurrency_limiter=limiter,
+        retry=Retry(base=0.001),
+    )
+    error = ValueError("Invalid language")
+    backend = translator._engine = FlakyBackend(n_failures=1, error=error)
+    with pytest.raises(ValueError):
+        translator.translate("olá")
+    assert backend.n_requests == 1
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
@@ -0,0 +1,122 @@
+import json
+import time
+import urllib.request
+
+from src.ratelimit import AIMDLimiter, Retry
+from src.telemetry import Metrics, MetricsWriter, report, serve
+from src.translator import Translator
+
+
+class FlakyBackend:
+    def __init__(self, n_failures):
+        self.n_failures = n_failures
+        self.n_requests = 0
+
+    def translate(self, text):
+        self.n_requests += 1
+        if self.n_requests <= self.n_failures:
+            raise TimeoutError("Request timed out")
+        return text
+
+
+def test_metrics():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.observe_request(0.05, 10)
+    metrics.observe_request(0.5, 20)
+    metrics.observe_request(5.0, 30)
+    metrics.observe_error(TimeoutError(), retried=True)
+    metrics.observe_error(ValueError(), retried=False)
+    metrics.gauge("concurrency_limit", lambda: 7)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["requests"] == 3
+    assert snapshot["chars"] == 60
+    assert snapshot["retries"] == 1
+    assert snapshot["errors"] == {"TimeoutError": 1, "ValueError": 1}
+    assert snapshot["latency"]["counts"] == [1, 1, 1]
+    assert snapshot["gauges"] == {"concurrency_limit": 7}
+
+
+def test_to_prometheus():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.observe_request(0.05, 10)
+    metrics.observe_request(0.5, 20)
+    metrics.observe_error(TimeoutError(), retried=True)
+
+    lines = metrics.to_prometheus().splitlines()
+    assert "translation_requests_total 2" in lines
+    assert 'translation_errors_total{type="TimeoutError"} 1' in lines
+    assert 'translation_request_latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'translation_request_latency_seconds_bucket{le="+Inf"} 2' in lines
+    assert "translation_request_latency_seconds_count 2" in lines
+
+
+def test_to_prometheus_escapes_labels():
+    metrics = Metrics()
+    metrics.observe_error(type('Bad"Error', (Exception,), {})(), retried=False)
+    assert 'translation_errors_total{type="Bad\\"Error"} 1' in metrics.to_prometheus()
+
+
+def test_metrics_writer_survives_errors(tmp_path):
+    metrics = Metrics()
+    metrics.gauge("broken", lambda: 1 / 0)
+    writer = MetricsWriter(metrics, tmp_path / "metrics.json", interval=0.01).start()
+    time.sleep(0.05)
+    assert writer._thread.is_alive()
+    metrics._gauges.clear()
+    writer.stop()
+    assert (tmp_path / "metrics.json").exists()
+
+
+def test_metrics_writer(tmp_path):
+    metrics = Metrics()
+    writer = MetricsWriter(metrics, tmp_path / "metrics.json")
+    writer.flush()
+    metrics.observe_request(0.1, 100)
+    writer.flush()
+    snapshot = json.loads((tmp_path / "metrics.json").read_text())
+    assert snapshot["chars"] == 100
+    assert snapshot["recent_chars_per_second"] > 0
+
+
+def test_report(tmp_path):
+    metrics = Metrics()
+    metrics.observe_request(0.1, 100)
+    with report(metrics, tmp_path / "metrics.json", port=0, interval=60):
+        pass
+    assert json.loads((tmp_path / "metrics.json").read_text())["requests"] == 1
+
+
+def test_serve():
+    metrics = Metrics()
+    metrics.observe_request(0.1, 100)
+    server = serve(metrics, port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/metrics"
+        body = urllib.request.urlopen(url).read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert "translation_chars_total 100" in body
+
+
+def test_translator_metrics():
+    metrics = Metrics()
+    limiter = AIMDLimiter(initial=2)
+    translator = Translator(
+        "pt",
+        "en",
+        backend="identity",
+        concurrency_limiter=limiter,
+        retry=Retry(max_retries=3, base=0.001),
+        metrics=metrics,
+    )
+    translator._engine = FlakyBackend(n_failures=2)
+    assert translator.translate("Olá") == "Olá"
+
+    snapshot = metrics.snapshot()
+    assert snapshot["requests"] == 1
+    assert snapshot["chars"] == 3
+    assert snapshot["retries"] == 2
+    assert snapshot["errors"] == {"TimeoutError": 2}
+    assert snapshot["gauges"]["requests_in_flight"] == 0
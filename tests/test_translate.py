@@ -2,7 +2,9 @@ from pathlib import Path
 
 import pytest
 
-from src.translator import Translator
+import src.translator
+from src.backends import DictionaryBackend, get_backend
+from src.translator import Translator, get_languages
 
 
 @pytest.fixture
@@ -17,6 +19,32 @@ def long_long_text():
     return (cur_dir / "long_text.txt").read_text()
 
 
+def test_get_languages():
+    languages = get_languages()
+    assert languages["portuguese"] == "pt"
+    assert languages["english"] == "en"
+
+
+def test_get_languages_refresh(tmp_path, monkeypatch):
+    from deep_translator import GoogleTranslator
+
+    path = tmp_path / "languages.json"
+    path.write_text('{"portuguese": "pt"}')
+    monkeypatch.setattr(src.translator, "LANGUAGES_PATH", path)
+    monkeypatch.setattr(
+        GoogleTranslator,
+        "get_supported_languages",
+        lambda self, as_dict: {"portuguese": "pt", "english": "en"},
+    )
+    src.translator._read_languages.cache_clear()
+    try:
+        assert get_languages() == {"portuguese": "pt"}
+        get_languages(refresh=True)
+        assert get_languages() == {"portuguese": "pt", "english": "en"}
+    finally:
+        src.translator._read_languages.cache_clear()
+
+
 class TestTranslator:
     def test_translate(self):
         translator = Translator(source="pt", target="en")
@@ -33,3 +61,31 @@ class TestTranslator:
         translator = Translator(source="pt", target="en")
         translated = translator.translate(long_long_text)
         assert isinstance(translated, str)
+
+
+class TestBackends:
+    def test_identity(self):
+        translator = Translator(source="pt", target="en", backend="identity")
+        assert translator.translate("Olá, mundo!") == "Olá, mundo!"
+
+    def test_reverse(self):
+        translator = Translator(source="pt", target="en", backend="reverse")
+        assert translator.translate("Olá, mundo!") == "!odnum ,álO"
+
+    def test_dictionary(self):
+        backend = get_backend("dictionary", source="pt", target="en")
+        assert backend.translate("O abacate é bom.") == "O abacate é bom."
+
+    def test_dictionary_lexicon(self, tmp_path):
+        lexicon = tmp_path / "lexicon.txt"
+        lexicon.write_text("olá\thello\nmundo\tworld\nbom\n")
+        backend = DictionaryBackend(source="pt", target="en", path=lexicon)
+        assert backend.translate("Olá, mundo bom!") == "hello, world bom!"
+
+    def test_long_text_offline(self, long_text):
+        translator = Translator(source="pt", target="en", backend="identity")
+        assert translator.translate(long_text) == long_text
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            Translator(source="pt", target="en", backend="bing")
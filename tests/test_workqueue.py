@@ -0,0 +1,67 @@
+import time
+
+from src.workqueue import WorkQueue
+
+
+def test_populate(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    queue.populate(25, range_size=10)
+    queue.populate(25, range_size=10)
+    assert queue.counts()["pending"] == 3
+
+
+def test_acquire(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    queue.populate(25, range_size=10)
+    assert queue.acquire("a") == (0, 10)
+    assert queue.acquire("b") == (10, 20)
+    assert queue.acquire("a") == (20, 25)
+    assert queue.acquire("b") is None
+
+
+def test_shared_between_connections(tmp_path):
+    path = tmp_path / "queue.sqlite"
+    first, second = WorkQueue(path), WorkQueue(path)
+    first.populate(20, range_size=10)
+    second.populate(20, range_size=10)
+    assert first.acquire("a") == (0, 10)
+    assert second.acquire("b") == (10, 20)
+
+
+def test_complete(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    queue.populate(20, range_size=10)
+    for _ in range(2):
+        start, _ = queue.acquire("a")
+        assert not queue.finished
+        queue.complete(start)
+    assert queue.finished
+    assert queue.acquire("a") is None
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    queue.populate(10, range_size=10)
+    assert queue.acquire("a", lease_seconds=0.01) == (0, 10)
+    assert queue.acquire("b") is None
+    time.sleep(0.02)
+    assert queue.counts()["expired"] == 1
+    assert queue.acquire("b") == (0, 10)
+    assert queue.renew("a") == 0
+
+
+def test_renew(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    queue.populate(10, range_size=10)
+    queue.acquire("a", lease_seconds=0.01)
+    assert queue.renew("a", lease_seconds=60) == 1
+    time.sleep(0.02)
+    assert queue.acquire("b") is None
+
+
+def test_release(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    queue.populate(10, range_size=10)
+    queue.acquire("a")
+    queue.release("a")
+    assert queue.acquire("b") == (0, 10)